@@ -1,15 +1,30 @@
 # app.py - Production Ready Version with Authentication
-from flask import Flask, redirect, url_for, request
+from flask import Flask, Request, redirect, url_for, request
 from flask_login import LoginManager, login_required, current_user
+import io
 import os
 from datetime import datetime
 from config.constants import *
-from config.models import db, Teacher, bcrypt
+from config.models import db, Teacher, bcrypt, upgrade_schema
 from config.routes import config
 from config.auth_routes import auth
+from config.upload_queue import upload_queue
+from config.audit_log import audit_log
+from config.db_pool import engine_options
+
+class InMemoryUploadRequest(Request):
+    """Keep uploaded files in memory instead of Werkzeug's temp files for bodies over 500KB
+
+    Uploads are already capped by MAX_CONTENT_LENGTH, and the audio pipeline reads
+    them straight from memory.
+    """
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
 
 def create_app():
     app = Flask(__name__)
+    app.request_class = InMemoryUploadRequest
     
     # Production security configuration
     app.secret_key = os.environ.get('SECRET_KEY', 'ah)vh+hug0)fo^-82@3sq(z77$9^+3q($=+k)zvuvhjm^w@5p*')
@@ -19,6 +34,7 @@ def create_app():
     
     app.config['SQLALCHEMY_DATABASE_URI'] = database_url or 'sqlite:///voice_attendance.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
     
     # Configure upload settings
     app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', 'voice_samples')
@@ -55,6 +71,13 @@ def create_app():
     # Create database tables
     with app.app_context():
         db.create_all()
+        upgrade_schema()
+    
+    # Background voice sample uploads (resumes anything left in the spool)
+    upload_queue.init_app(app)
+    
+    # Security events are written in batches by a background thread
+    audit_log.init_app(app)
     
     # Main route redirect based on authentication
     @app.route('/')
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Voice Attendance System - Enrollment/Attendance Hot Path Benchmark
+
+Times every stage of the audio pipeline (decode and resample from disk and
+from memory, validation, VAD trimming, each feature family, the last chunk of a
+streamed recording, scoring, DB write) and the /mark_attendance route end to
+end on synthetic clips, then reports p50/p95/p99 and peak RSS. Runs offline
+against a throwaway SQLite database with Cloudinary disabled. The route stages
+clear the feature cache first, so they measure full extraction as before the
+cache existed; route_mark_attendance_cached times a re-submitted clip.
+
+Usage:
+    python benchmarks/bench_pipeline.py                       # write benchmarks/results/<commit>.json
+    python benchmarks/bench_pipeline.py --durations 2 30 --formats wav mp3 m4a --repeat 20
+    python benchmarks/bench_pipeline.py --compare benchmarks/results/<older commit>.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Offline configuration - must be set before the app modules read their constants
+os.environ['USE_CLOUDINARY'] = 'false'
+os.environ.setdefault('USE_EXTRACTION_POOL', 'false')  # time the stages in-process
+os.environ['FEATURE_CACHE_DB'] = ''  # no shared cache tier - feature_cache.clear() must reach every entry
+WORK_DIR = tempfile.mkdtemp(prefix='voice_bench_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(WORK_DIR, 'bench.db')}"
+
+import numpy as np
+
+# Add the project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from audio_fixtures import build_clip_set
+
+RESULTS_DIR = Path(__file__).parent / 'results'
+CLASS_SIZE = 40
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def summarize(samples):
+    """Latency percentiles in milliseconds"""
+    values = np.array(samples) * 1000
+    return {
+        'n': len(values),
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p95_ms': round(float(np.percentile(values, 95)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3)
+    }
+
+
+def timed(fn, *args):
+    """(seconds, return value) of one call, with the pipeline's progress prints silenced"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        value = fn(*args)
+        elapsed = time.perf_counter() - start
+    return elapsed, value
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=project_root, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return 'unknown'
+
+
+def bench_stages(path, repeat, warmup=1):
+    """Per-stage timings of the feature pipeline for one clip (warm-up passes are discarded)"""
+    import librosa
+    from config.constants import FEATURE_SAMPLE_RATE, STREAM_CHUNK_SECONDS
+    from config.audio_processing import AudioUpload, load_audio, validate_audio, trim_to_speech
+    from config.feature_extraction import (
+        SpectrogramCache, mfcc_statistics, pitch_statistics, spectral_statistics,
+        formant_features, extract_feature_vector
+    )
+    from config.scoring import TemplateSet, score_pair, score_templates
+    from config.audio_stream import StreamingVoiceAnalyser
+
+    rng = np.random.default_rng(0)
+    class_vectors = rng.standard_normal((CLASS_SIZE, 80)).astype(np.float32)
+    templates = TemplateSet(class_vectors)
+
+    with open(path, 'rb') as f:
+        upload = AudioUpload(f.read(), os.path.basename(path))
+
+    timings = {}
+    iteration = 0
+
+    def record(stage, elapsed):
+        if iteration >= warmup:
+            timings.setdefault(stage, []).append(elapsed)
+
+    for iteration in range(warmup + repeat):
+        elapsed, audio = timed(load_audio, path)
+        record('decode', elapsed)
+
+        elapsed, _ = timed(load_audio, upload)
+        record('decode_memory', elapsed)
+
+        # Decoding already resamples to the feature rate
+        y = audio.y
+
+        elapsed, _ = timed(validate_audio, audio)
+        record('validation', elapsed)
+
+        sr = FEATURE_SAMPLE_RATE
+        elapsed, y = timed(trim_to_speech, audio, y, sr)
+        record('vad_trim', elapsed)
+
+        elapsed, spec = timed(SpectrogramCache, y, sr)
+        record('stft', elapsed)
+
+        elapsed, _ = timed(mfcc_statistics, spec)
+        record('features_mfcc', elapsed)
+
+        def pitch():
+            pitches, magnitudes = librosa.piptrack(S=spec.magnitude, sr=sr)
+            return pitch_statistics(pitches, magnitudes)
+        elapsed, _ = timed(pitch)
+        record('features_pitch', elapsed)
+
+        elapsed, _ = timed(spectral_statistics, spec)
+        record('features_spectral', elapsed)
+
+        elapsed, _ = timed(formant_features, spec)
+        record('features_formant', elapsed)
+
+        elapsed, features = timed(extract_feature_vector, y, sr)
+        record('features_total', elapsed)
+
+        # Live recording: only the last chunk and the summary statistics are left after the student stops
+        chunk = int(STREAM_CHUNK_SECONDS * sr)
+        recording = (np.clip(audio.y, -1, 1) * 32767).astype(np.int16).astype(np.float32) / 32768
+        analyser = StreamingVoiceAnalyser(sr)
+        last = (len(recording) - 1) // chunk * chunk
+        with contextlib.redirect_stdout(io.StringIO()):
+            for first in range(0, last, chunk):
+                analyser.update(recording[first:first + chunk])
+
+        def stream_finish():
+            analyser.update(recording[last:])
+            return analyser.finish()
+        elapsed, _ = timed(stream_finish)
+        record('stream_last_chunk', elapsed)
+
+        elapsed, _ = timed(score_pair, features, class_vectors[0])
+        record('scoring_1to1', elapsed)
+
+        elapsed, _ = timed(score_templates, features, templates)
+        record(f'scoring_1to{CLASS_SIZE}', elapsed)
+
+    return timings
+
+
+def bench_route(app, clips, repeat):
+    """DB write and /mark_attendance end to end for each clip, with and without a feature cache hit"""
+    from config.models import db, Teacher, Student, AttendanceRecord
+    from config.feature_cache import feature_cache
+
+    with app.app_context():
+        teacher = Teacher(email='bench@example.com', first_name='Bench', last_name='Teacher')
+        teacher.set_password('benchmark')
+        db.session.add(teacher)
+        db.session.commit()
+        teacher_id = teacher.id
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(teacher_id)
+        session['_fresh'] = True
+
+    timings = {}
+    for index, (name, path) in enumerate(clips.items()):
+        student_id = f"BENCH{index:03d}"
+        with open(path, 'rb') as f:
+            audio_bytes = f.read()
+
+        def post(url, data):
+            data = dict(data, voice_sample=(io.BytesIO(audio_bytes), os.path.basename(path)))
+            return client.post(url, data=data, content_type='multipart/form-data')
+
+        feature_cache.clear()
+        elapsed, response = timed(post, '/enroll_student', {
+            'student_id': student_id, 'student_name': f'Bench {index}', 'teacher_id': teacher_id
+        })
+        if not response.get_json().get('success'):
+            print(f"⚠️ Enrollment failed for {name}: {response.get_json().get('message')}")
+            continue
+        clip_timings = timings.setdefault(name, {})
+        clip_timings.setdefault('route_enroll_student', []).append(elapsed)
+
+        with app.app_context():
+            student_pk = Student.query.filter_by(student_id=student_id, teacher_id=teacher_id).first().id
+
+        def clear_attendance():
+            # Today's record would short-circuit the next attempt - clear it outside the timing
+            with app.app_context():
+                AttendanceRecord.query.filter_by(student_id=student_pk).delete()
+                db.session.commit()
+
+        for _ in range(repeat):
+            # The enrolled bytes are re-posted - without clearing this would time a cache hit
+            clear_attendance()
+            feature_cache.clear()
+            elapsed, response = timed(post, '/mark_attendance', {'student_id': student_id})
+            if not response.get_json().get('success'):
+                print(f"⚠️ Attendance failed for {name}: {response.get_json().get('message')}")
+            clip_timings.setdefault('route_mark_attendance', []).append(elapsed)
+
+            # Same clip again, now served from the cache the previous post filled
+            clear_attendance()
+            elapsed, response = timed(post, '/mark_attendance', {'student_id': student_id})
+            if not response.get_json().get('success'):
+                print(f"⚠️ Attendance failed for {name}: {response.get_json().get('message')}")
+            clip_timings.setdefault('route_mark_attendance_cached', []).append(elapsed)
+
+            def db_write():
+                with app.app_context():
+                    db.session.add(AttendanceRecord(student_id=student_pk, teacher_id=teacher_id, confidence_score=0.9))
+                    db.session.commit()
+            elapsed, _ = timed(db_write)
+            clip_timings.setdefault('db_write', []).append(elapsed)
+
+    return timings
+
+
+def compare(current, baseline_path, tolerance):
+    """Print p50 changes against an earlier results file; returns the number of regressions"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    print(f"\n📊 Comparison with {baseline['meta']['commit']} (tolerance {tolerance:.0%})")
+    regressions = 0
+    for clip, stages in current['results'].items():
+        for stage, stats in stages.items():
+            old = baseline['results'].get(clip, {}).get(stage)
+            if not old or not old['p50_ms']:
+                continue
+            change = stats['p50_ms'] / old['p50_ms'] - 1
+            flag = ''
+            if change > tolerance:
+                flag = '  ⚠️ REGRESSION'
+                regressions += 1
+            print(f"  {clip:24s} {stage:28s} {old['p50_ms']:10.3f} -> {stats['p50_ms']:10.3f} ms ({change:+.1%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the enrollment and attendance hot paths')
+    parser.add_argument('--durations', type=float, nargs='+', default=[2, 10, 30], help='clip lengths in seconds')
+    parser.add_argument('--formats', nargs='+', default=['wav', 'mp3', 'm4a'], help='wav, mp3 and/or m4a')
+    parser.add_argument('--sample-rate', type=int, default=44100)
+    parser.add_argument('--lead-silence', type=float, default=1.0, help='near-silent seconds before the voice starts')
+    parser.add_argument('--repeat', type=int, default=10, help='iterations per clip and stage')
+    parser.add_argument('--warmup', type=int, default=1, help='untimed passes per clip (import and cache warm-up)')
+    parser.add_argument('--skip-route', action='store_true', help='only time the pipeline stages')
+    parser.add_argument('--output', help='results JSON path (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', help='earlier results JSON to diff against')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='p50 slowdown flagged as a regression')
+    args = parser.parse_args()
+
+    print("🚀 Voice Attendance System - Hot Path Benchmark")
+    print("=" * 50)
+    os.chdir(WORK_DIR)  # keep the SQLite DB, security log and samples out of the repo
+    clips = build_clip_set(os.path.join(WORK_DIR, 'clips'), args.durations, args.formats, args.sample_rate,
+                           args.lead_silence)
+
+    results = {}
+    for name, path in clips.items():
+        print(f"⏱️ Pipeline stages: {name}")
+        results[name] = {stage: summarize(samples) for stage, samples in bench_stages(path, args.repeat, args.warmup).items()}
+
+    if not args.skip_route:
+        with contextlib.redirect_stdout(io.StringIO()):
+            from app import create_app
+            app = create_app()
+        print("⏱️ Routes: /enroll_student, /mark_attendance")
+        for name, stages in bench_route(app, clips, args.repeat).items():
+            results[name].update({stage: summarize(samples) for stage, samples in stages.items()})
+
+    commit = git_commit()
+    report = {
+        'meta': {
+            'commit': commit,
+            'created_at': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'repeat': args.repeat,
+            'warmup': args.warmup,
+            'lead_silence': args.lead_silence,
+            'extraction_pool': os.environ.get('USE_EXTRACTION_POOL')
+        },
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'results': results
+    }
+
+    for name, stages in results.items():
+        print(f"\n🎧 {name}")
+        for stage, stats in stages.items():
+            print(f"  {stage:28s} p50 {stats['p50_ms']:10.3f}  p95 {stats['p95_ms']:10.3f}  p99 {stats['p99_ms']:10.3f} ms")
+    print(f"\n💾 Peak RSS: {report['peak_rss_mb']} MB")
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"✅ Results written to {output}")
+
+    if args.compare and compare(report, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
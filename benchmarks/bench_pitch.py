@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Voice Attendance System - Pitch Statistics Parity Check and Micro-benchmark
+Checks config.feature_extraction.pitch_statistics against the per-frame loop it
+replaced, on seeded random piptrack matrices (including frames and whole
+matrices with no voiced bins) and a real piptrack, then times both
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+import librosa
+import numpy as np
+
+# Add the project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from audio_fixtures import synthesize_voice
+from config.constants import FEATURE_SAMPLE_RATE
+from config.feature_extraction import pitch_statistics
+
+FREQUENCY_BINS = 1025  # piptrack rows for the default n_fft of 2048
+
+
+def loop_pitch_statistics(pitches, magnitudes):
+    """Pitch statistics as extract_enhanced_features computed them before pitch_statistics"""
+    pitch_values = []
+    for t in range(pitches.shape[1]):
+        index = magnitudes[:, t].argmax()
+        pitch = pitches[index, t]
+        if pitch > 0:
+            pitch_values.append(pitch)
+
+    if pitch_values:
+        return [
+            np.mean(pitch_values),
+            np.std(pitch_values),
+            np.max(pitch_values),
+            np.min(pitch_values)
+        ]
+    return [0, 0, 0, 0]
+
+
+def random_piptrack(rng, frames, voiced_fraction, unvoiced_frames=0.0):
+    """piptrack-shaped (pitches, magnitudes): sparse pitch peaks, some frames with no voiced bin at all"""
+    voiced = rng.random((FREQUENCY_BINS, frames)) < voiced_fraction
+    pitches = np.where(voiced, rng.uniform(60, 400, (FREQUENCY_BINS, frames)), 0).astype(np.float32)
+    magnitudes = np.where(voiced, rng.random((FREQUENCY_BINS, frames)), 0).astype(np.float32)
+
+    silent = rng.random(frames) < unvoiced_frames
+    pitches[:, silent] = 0
+    magnitudes[:, silent] = 0  # argmax of an all-zero column is bin 0, whose pitch is 0
+    # Loud bins without a pitch estimate: the strongest bin is unvoiced although others are voiced
+    loud = rng.random(frames) < 0.1
+    magnitudes[0, loud] = 2.0
+    return pitches, magnitudes
+
+
+def parity_cases():
+    rng = np.random.default_rng(0)
+    cases = {
+        'dense': random_piptrack(rng, 400, 0.05),
+        'sparse': random_piptrack(rng, 400, 0.001),
+        'half_unvoiced_frames': random_piptrack(rng, 400, 0.02, unvoiced_frames=0.5),
+        'single_frame': random_piptrack(rng, 1, 0.05),
+        'all_unvoiced': random_piptrack(rng, 200, 0.02, unvoiced_frames=1.0),
+    }
+
+    y = synthesize_voice(5, FEATURE_SAMPLE_RATE, 140, 1, 0.5)
+    cases['synthetic_voice'] = librosa.piptrack(y=y, sr=FEATURE_SAMPLE_RATE)
+    return cases
+
+
+def check_parity():
+    """Assert the vectorized statistics equal the loop's for every case"""
+    for name, (pitches, magnitudes) in parity_cases().items():
+        expected = loop_pitch_statistics(pitches, magnitudes)
+        actual = pitch_statistics(pitches, magnitudes)
+        assert np.array_equal(np.asarray(actual, dtype=np.float64), np.asarray(expected, dtype=np.float64)), \
+            f"{name}: {actual} != {expected}"
+        print(f"✅ {name:22s} {np.round(np.asarray(actual, dtype=np.float64), 3)}")
+
+
+def time_per_call(fn, number):
+    """Best-of-5 seconds per call"""
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+
+if __name__ == "__main__":
+    print("⏱️ Pitch statistics parity check and micro-benchmark")
+    print("=" * 50)
+    check_parity()
+
+    pitches, magnitudes = parity_cases()['synthetic_voice']
+    loop_us = time_per_call(lambda: loop_pitch_statistics(pitches, magnitudes), 20) * 1e6
+    vectorized_us = time_per_call(lambda: pitch_statistics(pitches, magnitudes), 200) * 1e6
+    print(f"Per-frame loop ({pitches.shape[1]} frames): {loop_us:9.1f} µs")
+    print(f"pitch_statistics:              {vectorized_us:9.1f} µs")
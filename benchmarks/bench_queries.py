@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Voice Attendance System - Attendance Query Benchmark
+
+Seeds a throwaway SQLite database with a few million attendance records and
+times the duplicate check (one student's day) and the daily report (one
+teacher's day) with the old date(timestamp) = day filters and the half-open
+timestamp ranges, before and after the composite indexes exist. Prints the
+query plan of each so index use can be checked.
+
+Usage:
+    python benchmarks/bench_queries.py
+    python benchmarks/bench_queries.py --rows 5000000 --teachers 100 --days 365 --repeat 50
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+WORK_DIR = tempfile.mkdtemp(prefix='voice_query_bench_')
+DB_PATH = os.path.join(WORK_DIR, 'bench.db')
+
+import numpy as np
+
+# Add the project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from flask import Flask
+from config.models import db, Student, AttendanceRecord
+from config.voicerecognition import day_bounds
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'  # how SQLAlchemy stores DateTime on SQLite
+
+
+def create_bench_app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{DB_PATH}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def seed(rows, teachers, students_per_teacher, days, end_day):
+    """Bulk-load students and `rows` attendance records spread over `days` days"""
+    rng = np.random.default_rng(0)
+    connection = sqlite3.connect(DB_PATH)
+    connection.execute('PRAGMA journal_mode=OFF')
+    connection.execute('PRAGMA synchronous=OFF')
+
+    student_count = teachers * students_per_teacher
+    connection.executemany(
+        'INSERT INTO students (id, student_id, student_name, teacher_id, is_active) VALUES (?, ?, ?, ?, 1)',
+        ((i + 1, f"S{i:06d}", f"Student {i}", i // students_per_teacher + 1) for i in range(student_count))
+    )
+
+    start = datetime.combine(end_day - timedelta(days=days - 1), datetime.min.time())
+    batch = 200_000
+    for offset in range(0, rows, batch):
+        size = min(batch, rows - offset)
+        student_ids = rng.integers(1, student_count + 1, size)
+        seconds = np.sort(rng.uniform(0, days * 86400, size))
+        connection.executemany(
+            'INSERT INTO attendance_records (student_id, teacher_id, timestamp, confidence_score, status) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (
+                (int(student_id), int((student_id - 1) // students_per_teacher + 1),
+                 (start + timedelta(seconds=float(second))).strftime(TIMESTAMP_FORMAT), 0.9, 'present')
+                for student_id, second in zip(student_ids, seconds)
+            )
+        )
+        connection.commit()
+    connection.execute('ANALYZE')
+    connection.commit()
+    connection.close()
+
+
+def queries(student_pk, teacher_id, day):
+    """Old and new forms of the duplicate check and daily report"""
+    day_start, day_end = day_bounds(day)
+    return {
+        'duplicate_check_date_fn': AttendanceRecord.query.filter(
+            AttendanceRecord.student_id == student_pk,
+            db.func.date(AttendanceRecord.timestamp) == day
+        ),
+        'duplicate_check_range': AttendanceRecord.query.filter(
+            AttendanceRecord.student_id == student_pk,
+            AttendanceRecord.timestamp >= day_start,
+            AttendanceRecord.timestamp < day_end
+        ),
+        'daily_report_date_fn': AttendanceRecord.query.filter_by(teacher_id=teacher_id).filter(
+            db.func.date(AttendanceRecord.timestamp) == day
+        ).join(Student),
+        'daily_report_range': AttendanceRecord.query.filter_by(teacher_id=teacher_id).filter(
+            AttendanceRecord.timestamp >= day_start,
+            AttendanceRecord.timestamp < day_end
+        ).join(Student),
+    }
+
+
+def query_plan(query):
+    statement = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    with db.engine.connect() as connection:
+        rows = connection.execute(db.text(f"EXPLAIN QUERY PLAN {statement}")).fetchall()
+    return '; '.join(row[-1] for row in rows)
+
+
+def time_query(query, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = query.all()
+        samples.append(time.perf_counter() - start)
+        db.session.expunge_all()
+    return np.median(samples) * 1000, len(result)
+
+
+def run_all(label, cases, repeat):
+    print(f"\n📋 {label}")
+    results = {}
+    for name, query in cases.items():
+        ms, count = time_query(query, repeat)
+        results[name] = ms
+        print(f"  {name:26s} {ms:10.3f} ms  ({count} rows)")
+        print(f"  {'':26s} plan: {query_plan(query)}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark attendance lookups with and without the composite indexes')
+    parser.add_argument('--rows', type=int, default=2_000_000, help='attendance records to seed')
+    parser.add_argument('--teachers', type=int, default=50)
+    parser.add_argument('--students-per-teacher', type=int, default=40)
+    parser.add_argument('--days', type=int, default=365, help='days the records are spread over')
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per query (median reported)')
+    args = parser.parse_args()
+
+    print("🚀 Voice Attendance System - Attendance Query Benchmark")
+    print("=" * 50)
+    os.chdir(WORK_DIR)  # keep anything the app modules write out of the repo
+    app = create_bench_app()
+    end_day = date.today()
+
+    with app.app_context():
+        db.create_all()
+        # Seed without the composite indexes (as on a database created before they existed)
+        for index in AttendanceRecord.__table__.indexes:
+            index.drop(bind=db.engine)
+
+    start = time.perf_counter()
+    seed(args.rows, args.teachers, args.students_per_teacher, args.days, end_day)
+    print(f"🌱 Seeded {args.rows:,} attendance records in {time.perf_counter() - start:.1f}s ({DB_PATH})")
+
+    with app.app_context():
+        cases = queries(student_pk=1, teacher_id=1, day=end_day - timedelta(days=args.days // 2))
+        before = run_all("Without composite indexes", cases, args.repeat)
+
+        from config.models import upgrade_schema
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            upgrade_schema()
+        with db.engine.begin() as connection:
+            connection.execute(db.text('ANALYZE'))
+        print(f"\n🔧 upgrade_schema added the composite indexes in {time.perf_counter() - start:.1f}s")
+
+        after = run_all("With composite indexes", cases, args.repeat)
+
+    print("\n📊 Speed-up against the old date(timestamp) filter without indexes")
+    for name in ('duplicate_check', 'daily_report'):
+        baseline = before[f"{name}_date_fn"]
+        print(f"  {name:18s} date() + index {baseline / after[f'{name}_date_fn']:8.1f}x   "
+              f"range + index {baseline / after[f'{name}_range']:8.1f}x")
+
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
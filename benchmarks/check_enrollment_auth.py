@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Voice Attendance System - Public Enrollment Session Check
+
+The public /enroll_student route logs the teacher in for the duration of the
+enrollment. This check saturates the feature extraction pool, posts an
+anonymous enrollment (which must answer 503) and asserts the session is still
+anonymous afterwards: /dashboard redirects to the login page and the session
+holds no user id. Runs offline against a throwaway SQLite database.
+
+Usage:
+    python benchmarks/check_enrollment_auth.py
+"""
+
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+# Offline configuration - must be set before the app modules read their constants
+os.environ['USE_CLOUDINARY'] = 'false'
+os.environ['USE_EXTRACTION_POOL'] = 'true'
+os.environ['FEATURE_CACHE_DB'] = ''
+WORK_DIR = tempfile.mkdtemp(prefix='voice_auth_check_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(WORK_DIR, 'check.db')}"
+
+import soundfile as sf
+
+# Add the project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from audio_fixtures import synthesize_voice
+
+
+def main():
+    os.chdir(WORK_DIR)  # keep the SQLite DB and security log out of the repo
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app import create_app
+        app = create_app()
+    from config.models import db, Teacher
+    from config.extraction_pool import extraction_pool
+
+    with app.app_context():
+        teacher = Teacher(email='check@example.com', first_name='Check', last_name='Teacher')
+        teacher.set_password('check')
+        db.session.add(teacher)
+        db.session.commit()
+        teacher_id = teacher.id
+
+    clip = io.BytesIO()
+    sf.write(clip, synthesize_voice(5, 22050), 22050, format='WAV', subtype='PCM_16')
+
+    # Take every pool slot so the enrollment is turned away as busy
+    for _ in range(extraction_pool.max_pending):
+        extraction_pool._slots.acquire()
+
+    client = app.test_client()
+    assert client.get('/dashboard').status_code == 302
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = client.post('/enroll_student', data={
+            'student_id': 'CHECK001', 'student_name': 'Check Student', 'teacher_id': teacher_id,
+            'voice_sample': (io.BytesIO(clip.getvalue()), 'sample.wav')
+        }, content_type='multipart/form-data')
+    assert response.status_code == 503, response.get_json()
+    assert response.get_json().get('busy')
+
+    # Still anonymous after the busy response
+    with client.session_transaction() as session:
+        assert '_user_id' not in session, dict(session)
+    assert client.get('/dashboard').status_code == 302
+    print("✅ Busy public enrollment left the session anonymous")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
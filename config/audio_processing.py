@@ -0,0 +1,310 @@
+import io
+import os
+import librosa
+import numpy as np
+import soundfile as sf
+import soxr
+from .constants import *
+from .ffmpeg_decoder import ffmpeg_decoder
+
+DECODE_BLOCK_FRAMES = 65536  # native-rate frames read (and resampled) at a time
+
+
+class AudioUpload:
+    """Uploaded audio kept in memory: the raw bytes plus the client's file name"""
+
+    def __init__(self, data, filename):
+        self.data = data
+        self.filename = filename
+
+    @classmethod
+    def from_file_storage(cls, file_storage):
+        """Read a Werkzeug FileStorage without saving it to disk"""
+        return cls(file_storage.read(), file_storage.filename)
+
+    @property
+    def extension(self):
+        if self.filename and '.' in self.filename:
+            return self.filename.rsplit('.', 1)[1].lower()
+        return 'wav'
+
+    def open(self):
+        return io.BytesIO(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __str__(self):
+        return f"{self.filename} (in memory, {len(self.data)} bytes)"
+
+
+class DecodedAudio:
+    """Audio clip decoded once per request and shared by every processing stage"""
+
+    def __init__(self, y, sr, source=None):
+        self.y = y
+        self.sr = sr
+        self.source = source
+        self.validation = None  # (is_valid, message) once validate_audio_file has run
+        self.voice_stats = None  # VoiceContentStats from validation, reused for trimming
+
+    @property
+    def duration(self):
+        return len(self.y) / self.sr
+
+
+def load_audio(source, target_sr=FEATURE_SAMPLE_RATE):
+    """Decode a file path or AudioUpload to mono at target_sr (a sample rate, never None)
+
+    Every clip is resampled while it is decoded, so a DecodedAudio is always at
+    the rate it was loaded with - FEATURE_SAMPLE_RATE everywhere in the app.
+    Already decoded audio is passed through. Validation and feature extraction
+    both work on this one signal, so nothing is resampled later in the request.
+    """
+    if isinstance(source, DecodedAudio):
+        return source
+
+    try:
+        with sf.SoundFile(source.open() if isinstance(source, AudioUpload) else source) as f:
+            return DecodedAudio(_read_mono(f, target_sr), target_sr, source=source)
+    except RuntimeError:
+        pass  # not a format libsndfile can read (M4A)
+
+    # ffmpeg decodes and resamples in one go, straight from memory
+    if isinstance(source, AudioUpload):
+        y = ffmpeg_decoder.decode(source.data, target_sr, source.extension)
+    else:
+        y = ffmpeg_decoder.decode(source, target_sr, os.path.splitext(source)[1].lstrip('.'))
+    return DecodedAudio(y, target_sr, source=source)
+
+
+def _read_mono(f, target_sr):
+    """Read an open SoundFile block by block, downmixing to mono and resampling to target_sr on the way
+
+    Only one block of native-rate audio is held at a time. soxr's streaming
+    resampler produces the same samples as resampling the whole clip at once,
+    and the length is fixed the way librosa.resample fixes it.
+    """
+    stream = None
+    if target_sr != f.samplerate:
+        stream = soxr.ResampleStream(f.samplerate, target_sr, 1, dtype='float32', quality=RESAMPLE_QUALITY)
+
+    blocks = []
+    n_frames = 0
+    for block in f.blocks(DECODE_BLOCK_FRAMES, dtype='float32', always_2d=True):
+        n_frames += len(block)
+        mono = block[:, 0] if block.shape[1] == 1 else block.mean(axis=1)
+        blocks.append(stream.resample_chunk(mono) if stream else mono)
+
+    if stream is None:
+        return np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.float32)
+
+    blocks.append(stream.resample_chunk(np.zeros(0, dtype=np.float32), last=True))
+    return librosa.util.fix_length(np.concatenate(blocks), size=int(np.ceil(n_frames * target_sr / f.samplerate)))
+
+
+class VoiceContentStats:
+    """Frame-wise energy and voice-band statistics of a decoded clip"""
+
+    def __init__(self, frame_energy, frame_length, rms, voice_ratio):
+        self.frame_energy = frame_energy  # RMS of each non-overlapping energy frame
+        self.frame_length = frame_length  # samples per energy frame at the analysed rate
+        self.rms = rms
+        self.voice_ratio = voice_ratio  # share of spectral magnitude in the 85 Hz - 8 kHz band
+
+
+class VoiceContentAccumulator:
+    """Running frame energy and voice-band totals, fed one block of samples at a time
+
+    Only block_frames rFFT frames are held at a time, and the voice-band ratio is
+    accumulated across frames the same way the original full-length check compared
+    the band against the whole (two-sided) magnitude spectrum. Each rFFT frame
+    spans fft_frames energy frames, whose RMS is kept for voice-activity trimming.
+    """
+
+    def __init__(self, sr, frame_duration=ENERGY_FRAME_DURATION,
+                 fft_frames=VALIDATION_FFT_FRAMES, block_frames=VALIDATION_BLOCK_FRAMES):
+        self.sr = sr
+        self.energy_length = max(1, int(sr * frame_duration))
+        self.fft_frames = fft_frames
+        self.fft_length = self.energy_length * fft_frames
+        self.block_frames = block_frames
+        self.band_start = int(85 * self.fft_length / sr)
+        self.band_end = int(8000 * self.fft_length / sr)
+
+        self.n_samples = 0
+        self.total_square = 0.0
+        self.band_magnitude = 0.0
+        self.total_magnitude = 0.0
+        self._energy = []
+        self._pending = np.zeros(0, dtype=np.float32)  # samples of an incomplete rFFT frame
+
+    @property
+    def frame_energy(self):
+        """RMS of the energy frames seen so far (complete rFFT frames only)"""
+        return np.concatenate(self._energy) if self._energy else np.zeros(0, dtype=np.float32)
+
+    def update(self, y):
+        self.n_samples += len(y)
+        if len(self._pending):
+            y = np.concatenate((self._pending, y))
+
+        complete = len(y) // self.fft_length
+        for first in range(0, complete, self.block_frames):
+            last = min(first + self.block_frames, complete)
+            self._add_frames(y[first * self.fft_length:last * self.fft_length])
+        self._pending = y[complete * self.fft_length:].copy()
+
+    def _add_frames(self, block):
+        n_frames = len(block) // self.fft_length
+        squares = np.sum(block.reshape(-1, self.energy_length).astype(np.float64) ** 2, axis=1)
+        self.total_square += squares.sum()
+        self._energy.append(np.sqrt(squares / self.energy_length).astype(np.float32))
+
+        magnitude = np.abs(np.fft.rfft(block.reshape(n_frames, self.fft_length), axis=1))
+        self.band_magnitude += magnitude[:, self.band_start:self.band_end].sum()
+
+        # Mirror the one-sided spectrum: DC (and Nyquist for even frames) appear once
+        mirrored = 2 * magnitude.sum() - magnitude[:, 0].sum()
+        if self.fft_length % 2 == 0:
+            mirrored -= magnitude[:, -1].sum()
+        self.total_magnitude += mirrored
+
+    def finish(self):
+        """Zero pad the trailing partial frame and return the clip's VoiceContentStats"""
+        if len(self._pending):
+            self._add_frames(np.pad(self._pending, (0, self.fft_length - len(self._pending))))
+            self._pending = self._pending[:0]
+
+        n_energy_frames = int(np.ceil(self.n_samples / self.energy_length))
+        rms = np.sqrt(self.total_square / self.n_samples) if self.n_samples else 0.0
+        voice_ratio = self.band_magnitude / self.total_magnitude if self.total_magnitude > 0 else 0.0
+        return VoiceContentStats(self.frame_energy[:n_energy_frames], self.energy_length, rms, voice_ratio)
+
+
+def analyse_voice_content(y, sr, frame_duration=ENERGY_FRAME_DURATION,
+                          fft_frames=VALIDATION_FFT_FRAMES, block_frames=VALIDATION_BLOCK_FRAMES):
+    """Stream over the signal in blocks of rFFT frames with bounded memory
+
+    Replaces a full-length complex FFT of the clip; see VoiceContentAccumulator.
+    """
+    accumulator = VoiceContentAccumulator(sr, frame_duration, fft_frames, block_frames)
+    accumulator.update(y)
+    return accumulator.finish()
+
+
+def validate_audio(audio_file):
+    """Validate audio quality and properties, once per decoded clip"""
+    try:
+        audio = load_audio(audio_file)
+
+        if audio.validation is None:
+            audio.validation = _validate_decoded_audio(audio)
+        return audio.validation
+
+    except Exception as e:
+        return False, f"Error processing audio file: {str(e)}"
+
+
+def _validate_decoded_audio(audio):
+    """Run the quality checks on an already decoded clip"""
+    y, sr = audio.y, audio.sr
+    duration = audio.duration
+
+    # Check duration
+    if duration < MIN_AUDIO_DURATION:
+        return False, f"Audio too short. Minimum {MIN_AUDIO_DURATION} seconds required."
+
+    if duration > MAX_AUDIO_DURATION:
+        return False, f"Audio too long. Maximum {MAX_AUDIO_DURATION} seconds allowed."
+
+    # Frame-wise pass over the clip (streamed clips arrive with it already done);
+    # per-frame energy is kept for voice-activity trimming
+    if audio.voice_stats is None:
+        audio.voice_stats = analyse_voice_content(y, sr)
+    stats = audio.voice_stats
+    energy = stats.rms
+
+    # Check for silence (basic voice activity detection)
+    if energy < 0.001:  # Threshold for silence detection
+        return False, "Audio appears to be silent or too quiet."
+
+    # Look for voice-like frequency content (roughly 85Hz - 8kHz)
+    if stats.voice_ratio < 0.1:  # At least 10% energy in voice range
+        return False, "Audio doesn't appear to contain voice content."
+
+    print(f"✅ Audio validation passed: Duration {duration:.2f}s, Energy: {energy:.4f}")
+    return True, "Audio validation successful"
+
+
+def detect_speech(frame_energy, frame_duration=ENERGY_FRAME_DURATION, mode=VAD_MODE, top_db=VAD_TOP_DB,
+                  min_silence=VAD_MIN_SILENCE, padding=VAD_PADDING):
+    """Speech intervals as [start, end) energy-frame indices, from the validation pass's frame energy
+
+    'edges' keeps everything between the first and last active frame; 'split'
+    also drops pauses of at least min_silence. Returns [] when nothing is active.
+    """
+    if mode == 'off' or not len(frame_energy) or frame_energy.max() <= 0:
+        return []
+
+    active = np.flatnonzero(frame_energy > frame_energy.max() * 10 ** (-top_db / 20))
+    if mode == 'split':
+        gap = max(1, int(round(min_silence / frame_duration)))
+        breaks = np.flatnonzero(np.diff(active) > gap)
+        starts = np.concatenate(([active[0]], active[breaks + 1]))
+        ends = np.concatenate((active[breaks], [active[-1]])) + 1
+    else:
+        starts, ends = active[:1], active[-1:] + 1
+
+    # Pad each interval and merge any that now overlap
+    pad = int(round(padding / frame_duration))
+    intervals = []
+    for start, end in zip(starts, ends):
+        start, end = max(0, start - pad), min(len(frame_energy), end + pad)
+        if intervals and start <= intervals[-1][1]:
+            intervals[-1] = (intervals[-1][0], int(end))
+        else:
+            intervals.append((int(start), int(end)))
+    return intervals
+
+
+def speech_ranges(stats, stats_sr, sr, n_samples):
+    """[start, end) sample ranges of an n_samples clip at rate sr that count as speech
+
+    stats are the VoiceContentStats of the same clip analysed at stats_sr. Returns
+    None when the whole clip should be used (VAD off, nothing detected, or less
+    than VAD_MIN_SPEECH of speech).
+    """
+    frame_duration = stats.frame_length / stats_sr
+    intervals = detect_speech(stats.frame_energy, frame_duration)
+    if not intervals:
+        return None
+
+    samples_per_frame = frame_duration * sr
+    ranges = []
+    for start, end in intervals:
+        start = min(int(start * samples_per_frame), n_samples)
+        ranges.append((start, max(start, min(int(end * samples_per_frame), n_samples))))
+
+    if sum(end - start for start, end in ranges) < VAD_MIN_SPEECH * sr:
+        return None
+    return ranges
+
+
+def trim_to_speech(audio, y, sr):
+    """Drop the non-speech parts of y (the clip at rate sr) before feature extraction
+
+    Reuses the frame energy from validation, so no extra pass over the audio is
+    needed. Falls back to the whole clip when less than VAD_MIN_SPEECH of speech
+    is found.
+    """
+    if audio.voice_stats is None:
+        return y
+
+    ranges = speech_ranges(audio.voice_stats, audio.sr, sr, len(y))
+    if ranges is None:
+        return y
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        return y[start:end]
+    return np.concatenate([y[start:end] for start, end in ranges])
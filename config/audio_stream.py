@@ -0,0 +1,441 @@
+import glob
+import io
+import os
+import re
+import threading
+import time
+import uuid
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines - single process, no cross-worker locking
+    fcntl = None
+
+from .constants import *
+from .audio_processing import (AudioUpload, DecodedAudio, VoiceContentAccumulator, validate_audio,
+                               detect_speech, speech_ranges, trim_to_speech)
+from .extraction_pool import ExtractionPoolBusy
+from .feature_extraction import (N_FFT, HOP_LENGTH, FORMANT_FRAMES, mel_mfcc_statistics, dominant_pitches,
+                                 voiced_pitch_statistics, spectral_frames, spectral_frame_statistics,
+                                 opening_formants, normalize_features, extract_feature_vector)
+
+STREAM_ID_PATTERN = re.compile(r'^(\d+)-[0-9a-f]{32}$')  # <teacher id>-<random hex>
+SAMPLE_WIDTH = 2  # chunks are 16-bit little-endian mono PCM
+
+
+def stream_owner(stream_id):
+    """Id of the teacher a recording stream was opened for, or None for a malformed id"""
+    match = STREAM_ID_PATTERN.match(stream_id or '')
+    return int(match.group(1)) if match else None
+
+
+class StreamError(Exception):
+    """Raised when a recording chunk cannot be accepted; status is the HTTP code to answer with"""
+
+    def __init__(self, message, status=400, received=None):
+        super().__init__(message)
+        self.status = status
+        self.received = received
+
+
+class StreamedAudio(AudioUpload):
+    """A finished recording stream: the clip as WAV bytes plus its precomputed analysis"""
+
+    def __init__(self, data, filename, analysis):
+        super().__init__(data, filename)
+        self.analysis = analysis  # analyse_voice_sample-shaped dict
+
+
+class StreamingFeatures:
+    """Per-frame STFT descriptors of y[start:], computed as the samples arrive
+
+    Frames are identical to a centred librosa.stft of the trimmed clip: a frame is
+    only computed once its whole window has been received, and the frames that
+    overlap the clip's end are redone with zero padding in finish(). The summary
+    statistics need the whole clip (power_to_db floors every mel bin relative to
+    the loudest one), so the per-frame rows are kept and reduced at the end.
+    """
+
+    def __init__(self, sr, start=0):
+        self.sr = sr
+        self.start = start
+        self.n_frames = 0
+        self._mel = []
+        self._pitches = []
+        self._centroids = []
+        self._rolloff = []
+        self._formant_columns = []
+
+    def update(self, y):
+        """Compute every frame whose window lies within the samples received so far"""
+        available = len(y) - self.start
+        last = (available - N_FFT // 2) // HOP_LENGTH
+        if last < self.n_frames:
+            return
+        self._add_frames(self._padded_segment(y, self.n_frames, last), self.n_frames)
+
+    def _padded_segment(self, y, first, last, end=None):
+        """Samples of frames first..last of the centred STFT, zero padded outside [start, end)"""
+        end = len(y) if end is None else end
+        pad = N_FFT // 2
+        lo = first * HOP_LENGTH - pad
+        hi = last * HOP_LENGTH + pad
+        segment = y[self.start + max(lo, 0):self.start + min(hi, end - self.start)]
+        return np.pad(segment, (max(-lo, 0), max(hi - (end - self.start), 0)))
+
+    def _add_frames(self, segment, first):
+        magnitude = np.abs(librosa.stft(segment, n_fft=N_FFT, hop_length=HOP_LENGTH, center=False))
+        self._mel.append(librosa.feature.melspectrogram(S=magnitude ** 2, sr=self.sr))
+
+        pitches, magnitudes = librosa.piptrack(S=magnitude, sr=self.sr)
+        self._pitches.append(dominant_pitches(pitches, magnitudes))
+
+        centroids, rolloff = spectral_frames(magnitude, self.sr)
+        self._centroids.append(centroids)
+        self._rolloff.append(rolloff)
+
+        if first < FORMANT_FRAMES:
+            self._formant_columns.append(magnitude[:, :FORMANT_FRAMES - first])
+        self.n_frames = first + magnitude.shape[1]
+
+    def _truncate(self, n_frames):
+        """Drop computed frames from n_frames onwards"""
+        self._mel = [np.hstack(self._mel)[:, :n_frames]]
+        self._pitches = [np.concatenate(self._pitches)[:n_frames]]
+        self._centroids = [np.concatenate(self._centroids)[:n_frames]]
+        self._rolloff = [np.concatenate(self._rolloff)[:n_frames]]
+        self._formant_columns = [np.hstack(self._formant_columns)[:, :n_frames]]
+        self.n_frames = n_frames
+
+    def finish(self, y, end):
+        """Feature vector of y[start:end], the same layout as extract_feature_vector"""
+        length = end - self.start
+        # Frames whose window reaches past the clip's end were computed without its padding
+        complete = max(0, (length - N_FFT // 2) // HOP_LENGTH + 1)
+        if self.n_frames > complete:
+            self._truncate(complete)
+
+        total = 1 + length // HOP_LENGTH
+        if self.n_frames < total:
+            self._add_frames(self._padded_segment(y, self.n_frames, total - 1, end), self.n_frames)
+
+        features = []
+        features.extend(mel_mfcc_statistics(np.hstack(self._mel)))
+        features.extend(voiced_pitch_statistics(np.concatenate(self._pitches)))
+        features.extend(spectral_frame_statistics(np.concatenate(self._centroids), np.concatenate(self._rolloff)))
+        formant_magnitude = np.hstack(self._formant_columns)[:, :FORMANT_FRAMES]
+        features.extend(opening_formants(formant_magnitude))
+        return normalize_features(features)
+
+
+class StreamingVoiceAnalyser:
+    """Validation and feature extraction of one recording, advanced chunk by chunk
+
+    The validation pass (frame energy, voice-band ratio) runs on every chunk, and
+    the STFT descriptors start from the speech onset the frame energy suggests so
+    far. If the final voice-activity trim starts elsewhere the descriptors are
+    recomputed from the right sample, so the result always matches
+    analyse_voice_sample on the same clip.
+    """
+
+    def __init__(self, sr=FEATURE_SAMPLE_RATE):
+        self.sr = sr
+        self.n_samples = 0
+        self._buffer = np.zeros(sr, dtype=np.float32)
+        self._voice = VoiceContentAccumulator(sr)
+        self._features = None
+
+    @property
+    def y(self):
+        return self._buffer[:self.n_samples]
+
+    def update(self, samples):
+        """Append float32 samples and advance the running analysis"""
+        if self.n_samples + len(samples) > len(self._buffer):
+            grown = np.zeros(max(2 * len(self._buffer), self.n_samples + len(samples)), dtype=np.float32)
+            grown[:self.n_samples] = self.y
+            self._buffer = grown
+        self._buffer[self.n_samples:self.n_samples + len(samples)] = samples
+        self.n_samples += len(samples)
+        self._voice.update(samples)
+
+        start = self._speech_onset()
+        if start is None:
+            return
+        if self._features is None or self._features.start != start:
+            self._features = StreamingFeatures(self.sr, start)
+        self._features.update(self.y)
+
+    def _speech_onset(self):
+        """First speech sample as far as the audio so far tells, or None to wait for the end"""
+        if VAD_MODE == 'off':
+            return 0
+        if VAD_MODE != 'edges':
+            return None  # pauses can only be cut once the whole clip is known
+        frame_duration = self._voice.energy_length / self.sr
+        intervals = detect_speech(self._voice.frame_energy, frame_duration)
+        if not intervals:
+            return None
+        # Same sample mapping as speech_ranges, so a confirmed onset needs no recomputation
+        return min(int(intervals[0][0] * (frame_duration * self.sr)), self.n_samples)
+
+    def finish(self, source=None):
+        """Validate the whole recording and return an analyse_voice_sample-shaped dict"""
+        sr = self.sr
+        y = self.y
+        audio = DecodedAudio(y, sr, source=source)
+        audio.voice_stats = self._voice.finish()
+
+        try:
+            print(f"🎤 Finishing streamed voice feature extraction: {source}")
+
+            valid, validation_message = validate_audio(audio)
+            if not valid:
+                print(f"❌ Audio validation failed: {validation_message}")
+                return {'valid': False, 'message': validation_message, 'features': None}
+
+            ranges = speech_ranges(audio.voice_stats, sr, sr, len(y)) or [(0, len(y))]
+            if len(ranges) > 1:
+                # Pauses were cut out - the spliced clip has no streamed frames to reuse
+                features_array = extract_feature_vector(trim_to_speech(audio, y, sr), sr)
+            else:
+                start, end = ranges[0]
+                if self._features is None or self._features.start != start:
+                    self._features = StreamingFeatures(sr, start)
+                    self._features.update(y[:end])
+                features_array = self._features.finish(y, end)
+
+            print(f"✅ Streamed feature extraction successful - Feature vector size: {len(features_array)}")
+            return {'valid': True, 'message': "Feature extraction successful", 'features': features_array}
+
+        except Exception as e:
+            error_msg = f"Error extracting enhanced features: {e}"
+            print(f"❌ {error_msg}")
+            return {'valid': True, 'message': error_msg, 'features': None}
+
+
+class AudioStreamRegistry:
+    """Recordings uploaded chunk by chunk while the student is still speaking
+
+    The raw PCM of each recording is appended to <stream_id>.pcm in the spool
+    directory under an flock, so chunks may land on any Gunicorn worker. Each
+    worker keeps a StreamingVoiceAnalyser per stream and catches it up from the
+    shared file, which means that by the time the form is submitted only the last
+    chunk is left to analyse.
+
+    Streams belong to a teacher (the id starts with theirs). Each worker holds at
+    most max_open analysers and each teacher at most max_per_teacher open
+    recordings; beyond that StreamError(503) is raised. Only analysis_slots chunk
+    analyses run at once per worker: a chunk arriving while they are taken is
+    stored and analysed with a later chunk, and finish() waits for a slot or
+    raises ExtractionPoolBusy, so request threads are not all tied up in librosa.
+    """
+
+    def __init__(self, spool_dir=STREAM_SPOOL_DIR, ttl=STREAM_TTL, sample_rate=FEATURE_SAMPLE_RATE,
+                 max_duration=MAX_AUDIO_DURATION, max_open=STREAM_MAX_OPEN, max_per_teacher=STREAM_MAX_PER_TEACHER,
+                 analysis_slots=STREAM_ANALYSIS_SLOTS, cleanup_interval=STREAM_CLEANUP_INTERVAL,
+                 slot_timeout=EXTRACTION_TIMEOUT):
+        self.spool_dir = spool_dir
+        self.ttl = ttl
+        self.sample_rate = sample_rate
+        self.max_bytes = int(max_duration * sample_rate) * SAMPLE_WIDTH
+        self.max_open = max_open
+        self.max_per_teacher = max_per_teacher
+        self.cleanup_interval = cleanup_interval
+        self.slot_timeout = slot_timeout
+        self.started = 0
+        self.finished = 0
+        self.rejected = 0
+        self.deferred = 0
+        self._analysers = {}  # stream_id -> StreamingVoiceAnalyser
+        self._locks = {}  # stream_id -> threading.Lock guarding its analyser
+        self._slots = threading.BoundedSemaphore(analysis_slots)
+        self._next_cleanup = 0
+        self._lock = threading.Lock()
+
+    def _path(self, stream_id):
+        if stream_owner(stream_id) is None:
+            return None
+        return os.path.join(self.spool_dir, stream_id + '.pcm')
+
+    def _reject(self, message):
+        with self._lock:
+            self.rejected += 1
+        raise StreamError(message, 503)
+
+    def start(self, teacher_id):
+        """Open a new recording for a teacher and return its id"""
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self.cleanup()
+
+        with self._lock:
+            worker_full = len(self._analysers) >= self.max_open
+        if worker_full:
+            self._reject('Too many recordings in progress. Please try again in a moment.')
+        if len(glob.glob(os.path.join(self.spool_dir, f"{teacher_id}-*.pcm"))) >= self.max_per_teacher:
+            self._reject('Too many recordings in progress for this class. Please try again in a moment.')
+
+        stream_id = f"{teacher_id}-{uuid.uuid4().hex}"
+        open(self._path(stream_id), 'wb').close()
+        with self._lock:
+            self.started += 1
+        return stream_id
+
+    def append(self, stream_id, offset, data):
+        """Store a chunk at byte offset and analyse it; returns the bytes received so far
+
+        Chunks already stored (a retried request) are acknowledged without being
+        written twice. Raises StreamError for unknown streams, gaps and recordings
+        longer than MAX_AUDIO_DURATION.
+        """
+        path = self._path(stream_id)
+        if path is None:
+            raise StreamError('Invalid recording stream', 404)
+        if offset < 0 or offset % SAMPLE_WIDTH or len(data) % SAMPLE_WIDTH:
+            raise StreamError('Chunks must be whole 16-bit samples')
+
+        try:
+            handle = open(path, 'r+b')
+        except FileNotFoundError:
+            raise StreamError('Recording stream expired. Please record again.', 404)
+
+        with handle:
+            if fcntl:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            size = os.fstat(handle.fileno()).st_size
+            if offset > size:
+                raise StreamError('Missing audio before this chunk', 409, received=size)
+            data = data[size - offset:]
+            if size + len(data) > self.max_bytes:
+                raise StreamError(f"Audio too long. Maximum {MAX_AUDIO_DURATION} seconds allowed.", 413, received=size)
+            if data:
+                handle.seek(size)
+                handle.write(data)
+                handle.flush()
+            received = size + len(data)
+
+        self._maybe_cleanup()
+        if not self._slots.acquire(blocking=False):
+            # Stored - a later chunk or finish() catches the analyser up
+            with self._lock:
+                self.deferred += 1
+            return received
+        try:
+            self._catch_up(stream_id, path, limit=True)
+        except FileNotFoundError:
+            raise StreamError('Recording stream expired. Please record again.', 404)
+        finally:
+            self._slots.release()
+        return received
+
+    def _catch_up(self, stream_id, path, limit=False):
+        """Feed this worker's analyser everything in the spool file it has not seen yet
+
+        With limit, a stream new to this worker is refused once max_open analysers exist.
+        """
+        with self._lock:
+            analyser = self._analysers.get(stream_id)
+            if analyser is None:
+                if limit and len(self._analysers) >= self.max_open:
+                    self.rejected += 1
+                    raise StreamError('Too many recordings in progress. Please try again in a moment.', 503)
+                analyser = self._analysers[stream_id] = StreamingVoiceAnalyser(self.sample_rate)
+                self._locks[stream_id] = threading.Lock()
+            lock = self._locks[stream_id]
+
+        with lock:
+            with open(path, 'rb') as f:
+                f.seek(analyser.n_samples * SAMPLE_WIDTH)
+                data = f.read()
+            data = data[:len(data) - len(data) % SAMPLE_WIDTH]
+            if data:
+                # Same scaling soundfile applies when reading 16-bit PCM
+                analyser.update(np.frombuffer(data, dtype='<i2').astype(np.float32) / 32768)
+        return analyser, lock
+
+    def finish(self, stream_id, teacher_id):
+        """Close a teacher's recording and return it as StreamedAudio, or None if it is unknown or expired
+
+        Raises ExtractionPoolBusy (leaving the recording in place) when no analysis slot frees up in time.
+        """
+        path = self._path(stream_id)
+        if path is None or stream_owner(stream_id) != teacher_id or not os.path.exists(path):
+            return None
+
+        if not self._slots.acquire(timeout=self.slot_timeout):
+            with self._lock:
+                self.rejected += 1
+            raise ExtractionPoolBusy("Voice processing is busy. Please try again in a moment.")
+        try:
+            try:
+                with open(path, 'r+b') as handle:
+                    if fcntl:
+                        fcntl.flock(handle, fcntl.LOCK_EX)  # wait for a chunk still being written
+                    analyser, lock = self._catch_up(stream_id, path)
+                    os.remove(path)
+            except FileNotFoundError:
+                return None  # finished by another request in the meantime
+
+            with lock:
+                upload = StreamedAudio(self._to_wav(analyser.y), 'recording.wav', None)
+                upload.analysis = analyser.finish(source=upload)  # only the last chunk's frames are left to do
+        finally:
+            self._slots.release()
+        self._forget(stream_id)
+        with self._lock:
+            self.finished += 1
+        return upload
+
+    def _to_wav(self, y):
+        buffer = io.BytesIO()
+        sf.write(buffer, y, self.sample_rate, format='WAV', subtype='PCM_16')
+        return buffer.getvalue()
+
+    def _forget(self, stream_id):
+        with self._lock:
+            self._analysers.pop(stream_id, None)
+            self._locks.pop(stream_id, None)
+
+    def _maybe_cleanup(self):
+        """cleanup() at most every cleanup_interval seconds"""
+        now = time.time()
+        with self._lock:
+            if now < self._next_cleanup:
+                return
+            self._next_cleanup = now + self.cleanup_interval
+        self.cleanup()
+
+    def cleanup(self):
+        """Delete recordings nobody has added to for STREAM_TTL seconds"""
+        cutoff = time.time() - self.ttl
+        for path in glob.glob(os.path.join(self.spool_dir, '*.pcm')):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+        with self._lock:
+            stale = [stream_id for stream_id in self._analysers if not os.path.exists(self._path(stream_id))]
+        for stream_id in stale:
+            self._forget(stream_id)
+
+    def status(self):
+        """Stream figures for the system status API"""
+        with self._lock:
+            return {
+                'active': len(self._analysers),
+                'max_open': self.max_open,
+                'started': self.started,
+                'finished': self.finished,
+                'rejected': self.rejected,
+                'deferred': self.deferred
+            }
+
+
+# Global instance
+audio_streams = AudioStreamRegistry()
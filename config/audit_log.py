@@ -0,0 +1,246 @@
+import atexit
+import json
+import os
+import queue
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines - single process, no cross-worker locking
+    fcntl = None
+
+from .constants import *
+from .models import db, SecurityLog
+
+
+class AuditLog:
+    """Security events written in batches by a background thread
+
+    Recording an event only queues it. The flusher thread wakes once flush_size
+    events are waiting or flush_interval seconds have passed, inserts the batch
+    into security_logs with one executemany and appends it to a JSONL backup
+    file. The backup is rotated at max_bytes, keeping `backups` older files; an
+    flock on a side file stops Gunicorn workers rotating it under each other.
+    """
+
+    def __init__(self, log_file=SECURITY_LOG_FILE, flush_size=AUDIT_FLUSH_SIZE, flush_interval=AUDIT_FLUSH_INTERVAL,
+                 max_bytes=SECURITY_LOG_MAX_BYTES, backups=SECURITY_LOG_BACKUPS, max_attempts=AUDIT_MAX_ATTEMPTS):
+        self.log_file = log_file
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.max_attempts = max_attempts
+        self.app = None
+        self.recorded = 0
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        self._queue = queue.Queue()
+        self._retry = []  # (attempts, rows) batches whose database insert failed
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Bind to the Flask app, convert a legacy JSON log and start the flusher thread"""
+        self.app = app
+        self._convert_legacy_log()
+        self._start()
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Threads do not survive a fork - each Gunicorn worker starts its own
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="audit-log-flusher", daemon=True)
+            self._thread.start()
+
+    def record(self, event):
+        """Queue one event: the JSONL fields plus 'logged_at' (UTC datetime for the database row)"""
+        self._queue.put(event)
+        with self._lock:
+            self.recorded += 1
+
+        if self.app is None:
+            # Not bound to an app (scripts) - write straight away in the caller's context
+            self.flush()
+            return
+        if self._pid != os.getpid():
+            self._start()
+        if self._queue.qsize() >= self.flush_size:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception as e:
+                print(f"❌ Security log flush error: {e}")
+
+    def flush(self):
+        """Write everything queued so far; needs an app context for the database insert
+
+        The insert runs on its own connection, so calling this from a request
+        never commits (or rolls back) the request's pending session changes.
+        """
+        with self._flush_lock:
+            events = []
+            while True:
+                try:
+                    events.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if events:
+                self._append_to_file(events)
+
+            # Only events with a teacher are stored in the database
+            rows = [
+                {
+                    'teacher_id': event['teacher_id'],
+                    'event_type': event['event_type'],
+                    'student_id': event['student_id'],
+                    'details': event['details'],
+                    'ip_address': event['ip_address'],
+                    'timestamp': event['logged_at']
+                }
+                for event in events if event['teacher_id']
+            ]
+            pending = self._retry + ([(0, rows)] if rows else [])
+            self._retry = []
+            for attempts, batch in pending:
+                self._insert(attempts, batch)
+
+    def _insert(self, attempts, rows):
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(db.insert(SecurityLog), rows)
+        except Exception as e:
+            attempts += 1
+            if attempts < self.max_attempts:
+                print(f"⚠️ Could not store {len(rows)} security events ({e}) - retrying with the next batch")
+                self._retry.append((attempts, rows))
+            else:
+                print(f"❌ Dropping {len(rows)} security events after {attempts} attempts (kept in {self.log_file}): {e}")
+                with self._lock:
+                    self.failed += len(rows)
+            return
+
+        with self._lock:
+            self.written += len(rows)
+            self.batches += 1
+
+    def _append_to_file(self, events):
+        lines = ''.join(
+            json.dumps({key: value for key, value in event.items() if key != 'logged_at'}) + '\n'
+            for event in events
+        ).encode()
+        try:
+            with open(self.log_file + '.lock', 'a') as lock:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                self._rotate_if_needed(len(lines))
+                with open(self.log_file, 'ab') as f:
+                    f.write(lines)
+        except Exception as e:
+            print(f"⚠️ Warning: Could not save security log to file: {e}")
+
+    def _rotate_if_needed(self, incoming):
+        """security_log.jsonl -> .1 -> .2 ... once the next write would pass max_bytes"""
+        try:
+            size = os.path.getsize(self.log_file)
+        except FileNotFoundError:
+            return
+        if not size or size + incoming <= self.max_bytes:
+            return
+
+        for index in range(self.backups - 1, 0, -1):
+            older = f"{self.log_file}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.log_file}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.log_file, f"{self.log_file}.1")
+        else:
+            os.remove(self.log_file)
+
+    def _convert_legacy_log(self):
+        """Carry a security log saved as one JSON array (older releases) over to the JSON lines file
+
+        Older releases wrote security_log.json; its events are put ahead of
+        anything already in security_log.jsonl and the old file is renamed to
+        <name>.migrated. A log_file that itself still holds an array is
+        rewritten in place.
+        """
+        with open(self.log_file + '.lock', 'a') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)  # one Gunicorn worker converts, the others find nothing left
+            self._convert_array_file(self.log_file, self.log_file)
+            root, extension = os.path.splitext(self.log_file)
+            if extension == '.jsonl':
+                legacy_file = root + '.json'
+                if self._convert_array_file(legacy_file, self.log_file):
+                    os.replace(legacy_file, legacy_file + '.migrated')
+
+    @staticmethod
+    def _convert_array_file(source, target):
+        """Write the events of a JSON array file in front of target's lines; returns True if source was an array"""
+        try:
+            with open(source, 'r') as f:
+                if f.read(1) != '[':
+                    return False
+                f.seek(0)
+                events = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return False
+
+        existing = ''
+        if source != target:
+            try:
+                with open(target, 'r') as f:
+                    existing = f.read()
+            except FileNotFoundError:
+                pass
+
+        temp_path = target + '.tmp'
+        with open(temp_path, 'w') as f:
+            for event in events:
+                f.write(json.dumps(event) + '\n')
+            f.write(existing)
+        os.replace(temp_path, target)
+        print(f"📦 Converted {len(events)} security log entries in {source} to JSON lines in {target}")
+        return True
+
+    def close(self):
+        """Flush what is still queued before the process exits"""
+        if self.app is None:
+            return
+        try:
+            with self.app.app_context():
+                self.flush()
+        except Exception as e:
+            print(f"❌ Security log flush error: {e}")
+
+    def status(self):
+        """Audit log figures for the system status API"""
+        with self._lock:
+            return {
+                'running': self._thread is not None and self._thread.is_alive(),
+                'queued': self._queue.qsize(),
+                'recorded': self.recorded,
+                'written': self.written,
+                'batches': self.batches,
+                'retrying': sum(len(rows) for _, rows in self._retry),
+                'failed': self.failed
+            }
+
+
+# Global instance
+audit_log = AuditLog()
+atexit.register(audit_log.close)
@@ -16,6 +16,15 @@ class CloudinaryService:
             api_secret=os.environ.get('CLOUDINARY_API_SECRET')
         )
     
+    def is_available(self):
+        """Whether uploads are enabled and credentials are configured"""
+        use_cloudinary = os.environ.get('USE_CLOUDINARY', 'true').lower() == 'true'
+        return use_cloudinary and all([
+            os.environ.get('CLOUDINARY_CLOUD_NAME'),
+            os.environ.get('CLOUDINARY_API_KEY'),
+            os.environ.get('CLOUDINARY_API_SECRET')
+        ])
+    
     def upload_voice_sample(self, file_path, student_id, teacher_id, purpose='enrollment'):
         """
         Upload voice sample to Cloudinary
@@ -37,7 +46,8 @@ class CloudinaryService:
                 return {
                     'success': False,
                     'error': 'Cloudinary disabled in configuration',
-                    'fallback': True
+                    'fallback': True,
+                    'retryable': False
                 }
             
             print(f"🌤️ Uploading to Cloudinary: {file_path}")
@@ -52,7 +62,8 @@ class CloudinaryService:
                 return {
                     'success': False,
                     'error': 'Cloudinary not configured',
-                    'fallback': True
+                    'fallback': True,
+                    'retryable': False
                 }
             
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -89,7 +100,8 @@ class CloudinaryService:
             return {
                 'success': False,
                 'error': str(e),
-                'fallback': True
+                'fallback': True,
+                'retryable': True
             }
     
     def delete_voice_sample(self, public_id):
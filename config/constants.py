@@ -2,6 +2,14 @@ import os
 
 # Database Configuration
 DATABASE_URL = os.environ.get('DATABASE_URL')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '6'))  # connections kept per Gunicorn worker: request threads (--threads 4) plus upload/audit threads
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '4'))  # extra connections opened at peaks, closed when returned
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '10'))  # seconds a checkout waits for a free connection before failing
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', '1800'))  # seconds before a connection is replaced (-1 never)
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'  # test connections on checkout, replacing dropped ones
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', '30000'))  # PostgreSQL statement_timeout (0 disables)
+DB_POOL_SLOW_CHECKOUT_MS = float(os.environ.get('DB_POOL_SLOW_CHECKOUT_MS', '100'))  # checkouts slower than this are logged
+DB_POOL_LATENCY_SAMPLES = int(os.environ.get('DB_POOL_LATENCY_SAMPLES', '1000'))  # recent checkouts behind the latency percentiles
 
 # Cloudinary Configuration
 CLOUDINARY_CLOUD_NAME = os.environ.get('CLOUDINARY_CLOUD_NAME')
@@ -9,9 +17,21 @@ CLOUDINARY_API_KEY = os.environ.get('CLOUDINARY_API_KEY')
 CLOUDINARY_API_SECRET = os.environ.get('CLOUDINARY_API_SECRET')
 
 # Security Configuration
-SECURITY_LOG_FILE = os.environ.get('SECURITY_LOG_FILE', 'security_log.json')
+SECURITY_LOG_FILE = os.environ.get('SECURITY_LOG_FILE', 'security_log.jsonl')  # JSON lines backup of every security event
+SECURITY_LOG_MAX_BYTES = int(os.environ.get('SECURITY_LOG_MAX_BYTES', str(10 * 1024 * 1024)))  # rotate the backup file at this size
+SECURITY_LOG_BACKUPS = int(os.environ.get('SECURITY_LOG_BACKUPS', '5'))  # rotated files kept (security_log.jsonl.1 ... .5)
+AUDIT_FLUSH_SIZE = int(os.environ.get('AUDIT_FLUSH_SIZE', '50'))  # queued security events that trigger a write
+AUDIT_FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL', '2.0'))  # seconds between writes otherwise
+AUDIT_MAX_ATTEMPTS = int(os.environ.get('AUDIT_MAX_ATTEMPTS', '5'))  # database inserts tried per batch
 SUSPICIOUS_ATTEMPT_THRESHOLD = int(os.environ.get('SUSPICIOUS_ATTEMPT_THRESHOLD', '3'))
 RATE_LIMIT_WINDOW = int(os.environ.get('RATE_LIMIT_WINDOW', '300'))  # 5 minutes rate limiting
+FAILED_ATTEMPT_WINDOW = int(os.environ.get('FAILED_ATTEMPT_WINDOW', '3600'))  # seconds of failed verifications counted per student
+FAILED_ATTEMPT_LIMIT = int(os.environ.get('FAILED_ATTEMPT_LIMIT', '899'))  # failed verifications in the window that flag a student
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'sqlite')  # 'sqlite' (shared by all workers) or 'memory' (per process)
+RATE_LIMIT_DB = os.environ.get('RATE_LIMIT_DB', 'data/rate_limits.db')
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', '50000'))  # memory backend: students/keys tracked before the oldest are evicted
+RATE_LIMIT_MAX_EVENTS = int(os.environ.get('RATE_LIMIT_MAX_EVENTS', str(FAILED_ATTEMPT_LIMIT)))  # timestamps kept per key
+RATE_LIMIT_SWEEP_INTERVAL = float(os.environ.get('RATE_LIMIT_SWEEP_INTERVAL', '60'))  # seconds between expired-entry sweeps
 
 # File Storage Configuration (Legacy support)
 UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'voice_samples')
@@ -23,6 +43,58 @@ ALLOWED_EXTENSIONS = {'wav', 'mp3', 'm4a'}
 MIN_AUDIO_DURATION = float(os.environ.get('MIN_AUDIO_DURATION', '2.0'))
 MAX_AUDIO_DURATION = float(os.environ.get('MAX_AUDIO_DURATION', '30.0'))
 MIN_VOICE_THRESHOLD = float(os.environ.get('MIN_VOICE_THRESHOLD', '0.7'))
+IDENTIFICATION_MIN_MARGIN = float(os.environ.get('IDENTIFICATION_MIN_MARGIN', '0.05'))  # best vs runner-up score in identify mode
+ENERGY_FRAME_DURATION = float(os.environ.get('ENERGY_FRAME_DURATION', '0.025'))  # seconds per frame-energy value
+VALIDATION_FFT_FRAMES = int(os.environ.get('VALIDATION_FFT_FRAMES', '8'))  # energy frames per voice-band rFFT frame
+VALIDATION_BLOCK_FRAMES = int(os.environ.get('VALIDATION_BLOCK_FRAMES', '16'))  # rFFT frames held in memory at a time
+VAD_MODE = os.environ.get('VAD_MODE', 'edges')  # 'off', 'edges' (leading/trailing silence) or 'split' (also long pauses)
+VAD_TOP_DB = float(os.environ.get('VAD_TOP_DB', '35'))  # frames this far below the loudest frame count as silence
+VAD_MIN_SILENCE = float(os.environ.get('VAD_MIN_SILENCE', '0.3'))  # shorter pauses are kept in 'split' mode
+VAD_PADDING = float(os.environ.get('VAD_PADDING', '0'))  # seconds kept either side of speech (silence skews the MFCC min statistics)
+VAD_MIN_SPEECH = float(os.environ.get('VAD_MIN_SPEECH', '1.0'))  # keep the whole clip if less speech than this is found
+FEATURE_SAMPLE_RATE = 22050  # Stored voice features were extracted at this rate - do not change
+FEATURE_VERSION = '2.0'  # bump whenever feature extraction changes its output (invalidates cached features)
+RESAMPLE_QUALITY = os.environ.get('RESAMPLE_QUALITY', 'HQ')  # soxr tier used when decoding: 'QQ', 'LQ', 'MQ', 'HQ' (stored features) or 'VHQ'
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')  # decodes M4A uploads
+FFMPEG_POOL_SIZE = int(os.environ.get('FFMPEG_POOL_SIZE', '2'))  # concurrent decodes (and pre-started processes) per process
+FFMPEG_TIMEOUT = float(os.environ.get('FFMPEG_TIMEOUT', '30'))  # seconds a decode may take
+
+# Feature Extraction Pool Configuration
+USE_EXTRACTION_POOL = os.environ.get('USE_EXTRACTION_POOL', 'true').lower() == 'true'
+EXTRACTION_POOL_SIZE = int(os.environ.get('EXTRACTION_POOL_SIZE', '2'))  # worker processes per Gunicorn worker
+EXTRACTION_QUEUE_DEPTH = int(os.environ.get('EXTRACTION_QUEUE_DEPTH', '8'))  # running + queued clips before rejecting
+EXTRACTION_TIMEOUT = float(os.environ.get('EXTRACTION_TIMEOUT', '60'))  # seconds a request waits for its clip
+EXTRACTION_START_METHOD = os.environ.get('EXTRACTION_START_METHOD', 'spawn')
+MAX_BATCH_ATTENDANCE = int(os.environ.get('MAX_BATCH_ATTENDANCE', '60'))  # students per /api/attendance/batch request
+MAX_REPORT_DAYS = int(os.environ.get('MAX_REPORT_DAYS', '366'))  # longest range /api/attendance/summary accepts
+SECURITY_PAGE_SIZE = int(os.environ.get('SECURITY_PAGE_SIZE', '100'))  # security events per page on /security and /api/security/events
+SECURITY_PAGE_MAX = int(os.environ.get('SECURITY_PAGE_MAX', '500'))  # largest ?limit= the events API accepts
+SECURITY_EXPORT_BATCH = int(os.environ.get('SECURITY_EXPORT_BATCH', '1000'))  # rows fetched per query while streaming an export
+DASHBOARD_STATS_TTL = float(os.environ.get('DASHBOARD_STATS_TTL', '30'))  # seconds dashboard counters are trusted before a recount
+
+# Feature Cache Configuration
+FEATURE_CACHE_SIZE = int(os.environ.get('FEATURE_CACHE_SIZE', '256'))  # analysed clips kept in memory per Gunicorn worker (0 disables)
+FEATURE_CACHE_DB = os.environ.get('FEATURE_CACHE_DB', '')  # optional SQLite file shared by all workers, e.g. data/feature_cache.db
+FEATURE_CACHE_DB_MAX_ENTRIES = int(os.environ.get('FEATURE_CACHE_DB_MAX_ENTRIES', '5000'))
+
+# Live Recording Stream Configuration
+STREAM_SPOOL_DIR = os.environ.get('STREAM_SPOOL_DIR', 'uploads/streams')  # raw PCM of recordings in progress, shared by all workers
+STREAM_CHUNK_SECONDS = float(os.environ.get('STREAM_CHUNK_SECONDS', '1.0'))  # audio per chunk the browser sends
+STREAM_TTL = int(os.environ.get('STREAM_TTL', '300'))  # seconds an unfinished recording is kept
+STREAM_MAX_OPEN = int(os.environ.get('STREAM_MAX_OPEN', '40'))  # recordings analysed at once per Gunicorn worker (~3MB each)
+STREAM_MAX_PER_TEACHER = int(os.environ.get('STREAM_MAX_PER_TEACHER', '20'))  # open recordings per teacher across all workers
+STREAM_ANALYSIS_SLOTS = int(os.environ.get('STREAM_ANALYSIS_SLOTS', '1'))  # request threads per worker analysing chunks at once
+STREAM_CLEANUP_INTERVAL = float(os.environ.get('STREAM_CLEANUP_INTERVAL', '30'))  # seconds between sweeps for expired recordings
+
+# Voice Sample Upload Queue Configuration
+UPLOAD_BACKEND = os.environ.get('UPLOAD_BACKEND', 'cloudinary')  # 'cloudinary' or 'local' (stand-in for tests/offline runs)
+UPLOAD_SPOOL_DIR = os.environ.get('UPLOAD_SPOOL_DIR', 'uploads/spool')  # pending uploads, survives restarts
+UPLOAD_LOCAL_DIR = os.environ.get('UPLOAD_LOCAL_DIR', 'uploads/local')  # destination of the local backend
+UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', '2'))  # upload threads per Gunicorn worker
+UPLOAD_MAX_ATTEMPTS = int(os.environ.get('UPLOAD_MAX_ATTEMPTS', '6'))
+UPLOAD_RETRY_BASE = float(os.environ.get('UPLOAD_RETRY_BASE', '2'))  # seconds before the first retry, doubled each time
+UPLOAD_RETRY_MAX = float(os.environ.get('UPLOAD_RETRY_MAX', '300'))  # longest wait between retries
+UPLOAD_RESCAN_INTERVAL = float(os.environ.get('UPLOAD_RESCAN_INTERVAL', '60'))  # seconds between spool scans for orphaned jobs
 
 # Production Configuration
 MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', '16777216'))  # 16MB
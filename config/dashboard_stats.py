@@ -0,0 +1,111 @@
+import datetime
+import threading
+import time
+
+from .constants import *
+from .models import db, Student, AttendanceRecord, SecurityLog
+from .audit_log import audit_log
+
+# Security events counted as failed verifications on the dashboard
+FAILED_EVENT_TYPES = ('FAILED_VOICE_VERIFICATION', 'SUSPICIOUS_ACTIVITY_DETECTED')
+
+
+class DashboardStats:
+    """Per-teacher dashboard counters kept in memory between requests
+
+    Enrolled students, today's attendance, today's security events and failed
+    verifications are counted in SQL once, then kept up to date as this process
+    enrolls students, marks attendance and logs events. Entries are reloaded
+    after ttl seconds (picking up writes by other Gunicorn workers) and when
+    the day changes.
+    """
+
+    def __init__(self, ttl=DASHBOARD_STATS_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.loads = 0
+        self._entries = {}  # teacher_id -> counters plus 'day' and 'loaded_at'
+        self._lock = threading.Lock()
+
+    def get(self, teacher_id):
+        """Counters for a teacher: enrolled, attendance_today, events_today, failed_today"""
+        today = datetime.date.today()
+        with self._lock:
+            entry = self._entries.get(teacher_id)
+            if entry is not None and entry['day'] == today and time.time() - entry['loaded_at'] < self.ttl:
+                self.hits += 1
+                return self._counters(entry)
+
+        entry = self._load(teacher_id, today)
+        with self._lock:
+            self._entries[teacher_id] = entry
+            self.loads += 1
+        return self._counters(entry)
+
+    @staticmethod
+    def _counters(entry):
+        return {key: entry[key] for key in ('enrolled', 'attendance_today', 'events_today', 'failed_today')}
+
+    def _load(self, teacher_id, today):
+        # Events still queued for the database are counted too
+        audit_log.flush()
+        day_start = datetime.datetime.combine(today, datetime.time.min)
+        day_end = day_start + datetime.timedelta(days=1)
+
+        enrolled = db.session.query(db.func.count(Student.id)).filter(
+            Student.teacher_id == teacher_id,
+            Student.is_active == True
+        ).scalar()
+        attendance_today = db.session.query(db.func.count(db.distinct(AttendanceRecord.student_id))).filter(
+            AttendanceRecord.teacher_id == teacher_id,
+            AttendanceRecord.timestamp >= day_start,
+            AttendanceRecord.timestamp < day_end
+        ).scalar()
+        events_today, failed_today = db.session.query(
+            db.func.count(SecurityLog.id),
+            db.func.sum(db.case((SecurityLog.event_type.in_(FAILED_EVENT_TYPES), 1), else_=0))
+        ).filter(
+            SecurityLog.teacher_id == teacher_id,
+            SecurityLog.timestamp >= day_start,
+            SecurityLog.timestamp < day_end
+        ).one()
+
+        return {
+            'enrolled': enrolled,
+            'attendance_today': attendance_today,
+            'events_today': events_today,
+            'failed_today': failed_today or 0,
+            'day': today,
+            'loaded_at': time.time()
+        }
+
+    def _add(self, teacher_id, **deltas):
+        """Apply a write made by this process to a loaded entry (a stale one reloads on its own)"""
+        with self._lock:
+            entry = self._entries.get(teacher_id)
+            if entry is None or entry['day'] != datetime.date.today():
+                return
+            for key, delta in deltas.items():
+                entry[key] += delta
+
+    def student_enrolled(self, teacher_id):
+        self._add(teacher_id, enrolled=1)
+
+    def attendance_marked(self, teacher_id, count=1):
+        self._add(teacher_id, attendance_today=count)
+
+    def security_event(self, teacher_id, event_type):
+        self._add(teacher_id, events_today=1, failed_today=int(event_type in FAILED_EVENT_TYPES))
+
+    def invalidate(self, teacher_id):
+        with self._lock:
+            self._entries.pop(teacher_id, None)
+
+    def status(self):
+        """Cache figures for the system status API"""
+        with self._lock:
+            return {'teachers': len(self._entries), 'ttl': self.ttl, 'hits': self.hits, 'loads': self.loads}
+
+
+# Global instance
+dashboard_stats = DashboardStats()
@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+from .constants import *
+
+
+class PoolMonitor:
+    """Connection checkout figures for the database pool of this process
+
+    Every checkout is timed from the request for a connection until one is
+    handed over, which includes waiting for a free slot and opening overflow
+    connections. Recent timings give the latency percentiles; checkouts slower
+    than slow_ms are counted and logged, and timeouts (pool exhausted for
+    DB_POOL_TIMEOUT seconds) are counted separately.
+    """
+
+    def __init__(self, samples=DB_POOL_LATENCY_SAMPLES, slow_ms=DB_POOL_SLOW_CHECKOUT_MS):
+        self.slow_ms = slow_ms
+        self.checkouts = 0
+        self.slow = 0
+        self.timeouts = 0
+        self.max_ms = 0.0
+        self.peak_in_use = 0
+        self._latencies = deque(maxlen=samples)  # recent checkout times in ms
+        self._lock = threading.Lock()
+
+    def checked_out(self, seconds, in_use):
+        ms = seconds * 1000
+        with self._lock:
+            self.checkouts += 1
+            self._latencies.append(ms)
+            self.max_ms = max(self.max_ms, ms)
+            self.peak_in_use = max(self.peak_in_use, in_use)
+            slow = ms >= self.slow_ms
+            if slow:
+                self.slow += 1
+        if slow:
+            print(f"⚠️ Waited {ms:.0f}ms for a database connection ({in_use} in use)")
+
+    def timed_out(self, seconds):
+        with self._lock:
+            self.timeouts += 1
+        print(f"❌ No database connection free after {seconds:.1f}s - pool exhausted")
+
+    def status(self, pool):
+        """Pool figures for the system status API"""
+        with self._lock:
+            latencies = np.array(self._latencies)
+            figures = {
+                'checkouts': self.checkouts,
+                'slow_checkouts': self.slow,
+                'timeouts': self.timeouts,
+                'checkout_ms': {
+                    'p50': round(float(np.percentile(latencies, 50)), 3) if latencies.size else 0.0,
+                    'p95': round(float(np.percentile(latencies, 95)), 3) if latencies.size else 0.0,
+                    'max': round(self.max_ms, 3)
+                },
+                'peak_in_use': self.peak_in_use
+            }
+
+        if isinstance(pool, QueuePool):
+            capacity = pool.size() + max(pool._max_overflow, 0)
+            in_use = pool.checkedout()
+            figures.update({
+                'pool_size': pool.size(),
+                'max_overflow': pool._max_overflow,
+                'in_use': in_use,
+                'idle': pool.checkedin(),
+                'saturation': round(in_use / capacity, 4) if capacity else 0.0
+            })
+        return figures
+
+
+class MonitoredQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout took to pool_monitor"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_monitor.timed_out(time.perf_counter() - start)
+            raise
+        pool_monitor.checked_out(time.perf_counter() - start, self.checkedout())
+        return connection
+
+
+def engine_options(database_url):
+    """SQLALCHEMY_ENGINE_OPTIONS for database_url, sized per Gunicorn worker from the DB_POOL_* settings"""
+    if database_url.startswith('sqlite') and ':memory:' in database_url:
+        # One in-memory database per connection - keep SQLAlchemy's default pool
+        return {}
+
+    options = {
+        'poolclass': MonitoredQueuePool,
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING
+    }
+    if database_url.startswith('postgres') and DB_STATEMENT_TIMEOUT_MS > 0:
+        # Enforced by the server, so a stuck query frees its connection
+        options['connect_args'] = {'options': f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+# Global instance
+pool_monitor = PoolMonitor()
@@ -0,0 +1,144 @@
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from .constants import *
+from .feature_extraction import analyse_voice_sample, extract_feature_vector
+
+
+class ExtractionPoolBusy(Exception):
+    """Raised when the extraction pool cannot take more work right now"""
+
+
+def _warm_worker():
+    """Import librosa and compile its numba kernels before the first real clip arrives"""
+    t = np.arange(FEATURE_SAMPLE_RATE) / FEATURE_SAMPLE_RATE
+    extract_feature_vector((0.1 * np.sin(2 * np.pi * 150 * t)).astype(np.float32), FEATURE_SAMPLE_RATE)
+
+
+class FeatureExtractionPool:
+    """Process pool that runs librosa work outside the Gunicorn request workers
+
+    Requests hand a file path to a warm worker process and wait for the result,
+    so request threads stay free for lightweight routes. At most max_pending clips
+    (running plus queued) are accepted; beyond that ExtractionPoolBusy is raised
+    so routes can answer with a retryable 503 instead of piling up work.
+    """
+
+    def __init__(self, max_workers=EXTRACTION_POOL_SIZE, max_pending=EXTRACTION_QUEUE_DEPTH,
+                 timeout=EXTRACTION_TIMEOUT, enabled=USE_EXTRACTION_POOL):
+        self.enabled = enabled
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def _get_executor(self):
+        """Start the worker processes on first use (after Gunicorn has forked)"""
+        with self._lock:
+            if self._executor is None:
+                print(f"⚙️ Starting feature extraction pool with {self.max_workers} workers")
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(EXTRACTION_START_METHOD),
+                    initializer=_warm_worker
+                )
+            return self._executor
+
+    def _reset(self):
+        """Drop a broken executor so the next submission starts fresh workers"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _release(self, future):
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+        self._slots.release()
+
+    def submit(self, fn, *args, wait=None):
+        """Queue fn(*args) on the pool, or raise ExtractionPoolBusy when it is saturated
+
+        wait is how many seconds to wait for a free slot (None rejects immediately).
+        """
+        acquired = self._slots.acquire(timeout=wait) if wait else self._slots.acquire(blocking=False)
+        if not acquired:
+            with self._lock:
+                self.rejected += 1
+            raise ExtractionPoolBusy("Voice processing is busy. Please try again in a moment.")
+
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._reset()
+            raise ExtractionPoolBusy("Voice processing is restarting. Please try again in a moment.")
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.pending += 1
+        future.add_done_callback(self._release)
+        return future
+
+    def result(self, future, fallback=None):
+        """Wait for a submitted job; a crashed pool is reset and fallback() run inline"""
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise ExtractionPoolBusy("Voice processing timed out. Please try again in a moment.")
+        except BrokenProcessPool:
+            print("⚠️ Feature extraction pool crashed - restarting workers")
+            self._reset()
+            if fallback is None:
+                raise ExtractionPoolBusy("Voice processing is restarting. Please try again in a moment.")
+            return fallback()
+
+    def analyse(self, audio_file):
+        """Validate and extract features for a clip on a pool worker"""
+        future = self.submit(analyse_voice_sample, audio_file)
+        return self.result(future, fallback=lambda: analyse_voice_sample(audio_file))
+
+    def analyse_many(self, audio_files):
+        """Analyse several clips in parallel, waiting for free slots rather than rejecting"""
+        futures = [self.submit(analyse_voice_sample, audio_file, wait=self.timeout) for audio_file in audio_files]
+        return [
+            self.result(future, fallback=lambda audio_file=audio_file: analyse_voice_sample(audio_file))
+            for future, audio_file in zip(futures, audio_files)
+        ]
+
+    def status(self):
+        """Pool saturation figures for the system status API"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'workers': self.max_workers,
+                'started': self._executor is not None,
+                'pending': self.pending,
+                'max_pending': self.max_pending,
+                'completed': self.completed,
+                'rejected': self.rejected
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# Global instance
+extraction_pool = FeatureExtractionPool()
+atexit.register(extraction_pool.shutdown)
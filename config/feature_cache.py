@@ -0,0 +1,203 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from .constants import *
+from .audio_processing import AudioUpload
+
+# Settings that change what analyse_voice_sample returns for the same bytes; part
+# of every key so a configuration or extraction code change never serves stale features
+ANALYSIS_SETTINGS = (
+    FEATURE_VERSION, FEATURE_SAMPLE_RATE, RESAMPLE_QUALITY, MIN_AUDIO_DURATION, MAX_AUDIO_DURATION, ENERGY_FRAME_DURATION,
+    VALIDATION_FFT_FRAMES, VAD_MODE, VAD_TOP_DB, VAD_MIN_SILENCE, VAD_PADDING, VAD_MIN_SPEECH
+)
+
+
+class FeatureCache:
+    """Analysis results keyed by the SHA-256 of the audio bytes
+
+    Re-submitted clips (a retry after a network error or a rate-limit message)
+    skip decoding and feature extraction. Entries live in an in-process LRU of at
+    most max_entries; with FEATURE_CACHE_DB set they are also written to a
+    SQLite file shared by every Gunicorn worker on the host. Only deterministic
+    outcomes are cached: extracted features and validation rejections, never
+    decode or extraction errors.
+    """
+
+    def __init__(self, max_entries=FEATURE_CACHE_SIZE, db_path=FEATURE_CACHE_DB,
+                 db_max_entries=FEATURE_CACHE_DB_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.db_max_entries = db_max_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self._entries = OrderedDict()  # key -> analysis dict, least recently used first
+        self._salt = repr(ANALYSIS_SETTINGS).encode()
+        self._db = None
+        self._db_pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 or bool(self.db_path)
+
+    def key_for(self, audio_file):
+        """Content hash of an AudioUpload or file path; None for anything else (already decoded audio)"""
+        if not self.enabled:
+            return None
+        digest = hashlib.sha256(self._salt)
+        if isinstance(audio_file, AudioUpload):
+            digest.update(audio_file.data)
+        elif isinstance(audio_file, str):
+            try:
+                with open(audio_file, 'rb') as f:
+                    for block in iter(lambda: f.read(1 << 20), b''):
+                        digest.update(block)
+            except OSError:
+                return None
+        else:
+            return None
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Cached analysis for key (a copy), or None"""
+        if key is None:
+            return None
+
+        with self._lock:
+            analysis = self._entries.get(key)
+            if analysis is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._copy(analysis)
+
+        analysis = self._db_get(key)
+        with self._lock:
+            if analysis is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, analysis)
+        return self._copy(analysis)
+
+    def put(self, key, analysis):
+        """Store a deterministic analysis result"""
+        if key is None or not self.cacheable(analysis):
+            return
+        analysis = self._copy(analysis)
+        with self._lock:
+            self._remember(key, analysis)
+            self.stores += 1
+        self._db_put(key, analysis)
+
+    @staticmethod
+    def cacheable(analysis):
+        """Features, or a validation rejection - errors may not happen on the next attempt"""
+        if analysis['features'] is not None:
+            return True
+        return not analysis['valid'] and not analysis['message'].startswith('Error')
+
+    @staticmethod
+    def _copy(analysis):
+        features = analysis['features']
+        return dict(analysis, features=None if features is None else np.array(features, copy=True))
+
+    def _remember(self, key, analysis):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = analysis
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _connection(self):
+        """This process's SQLite connection (reopened after a fork)"""
+        if self._db is None or self._db_pid != os.getpid():
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS feature_cache ('
+                'key TEXT PRIMARY KEY, valid INTEGER NOT NULL, message TEXT NOT NULL, '
+                'features BLOB, last_used REAL NOT NULL)'
+            )
+            self._db.execute('CREATE INDEX IF NOT EXISTS idx_feature_cache_last_used ON feature_cache (last_used)')
+            self._db_pid = os.getpid()
+        return self._db
+
+    def _db_get(self, key):
+        if not self.db_path:
+            return None
+        try:
+            with self._lock:
+                db = self._connection()
+                row = db.execute('SELECT valid, message, features FROM feature_cache WHERE key = ?', (key,)).fetchone()
+                if row is None:
+                    return None
+                db.execute('UPDATE feature_cache SET last_used = ? WHERE key = ?', (time.time(), key))
+                db.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Feature cache read failed: {e}")
+            return None
+
+        valid, message, features = row
+        return {
+            'valid': bool(valid),
+            'message': message,
+            'features': None if features is None else np.frombuffer(features, dtype=np.float64).copy()
+        }
+
+    def _db_put(self, key, analysis):
+        if not self.db_path:
+            return
+        features = analysis['features']
+        blob = None if features is None else np.asarray(features, dtype=np.float64).tobytes()
+        try:
+            with self._lock:
+                db = self._connection()
+                db.execute(
+                    'INSERT OR REPLACE INTO feature_cache (key, valid, message, features, last_used) VALUES (?, ?, ?, ?, ?)',
+                    (key, int(analysis['valid']), analysis['message'], blob, time.time())
+                )
+                # Trim the least recently used rows once the table is 10% over its cap
+                count = db.execute('SELECT COUNT(*) FROM feature_cache').fetchone()[0]
+                if count > self.db_max_entries * 1.1:
+                    db.execute(
+                        'DELETE FROM feature_cache WHERE key IN '
+                        '(SELECT key FROM feature_cache ORDER BY last_used LIMIT ?)',
+                        (count - self.db_max_entries,)
+                    )
+                db.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Feature cache write failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def status(self):
+        """Cache figures for the system status API"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'shared_db': bool(self.db_path),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'hit_rate': round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0
+            }
+
+
+# Global instance
+feature_cache = FeatureCache()
@@ -0,0 +1,188 @@
+import librosa
+import numpy as np
+from .constants import *
+from .audio_processing import load_audio, validate_audio, trim_to_speech
+
+# STFT parameters shared by every spectral descriptor (librosa defaults, which the
+# stored voice features were originally extracted with)
+N_FFT = 2048
+HOP_LENGTH = 512
+
+N_MFCC = 13
+FORMANT_FRAMES = 10
+
+
+class SpectrogramCache:
+    """STFT of one clip, computed once and fed to every spectral descriptor"""
+
+    def __init__(self, y, sr, n_fft=N_FFT, hop_length=HOP_LENGTH):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.magnitude = np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length))
+        self._power = None
+
+    @property
+    def power(self):
+        if self._power is None:
+            self._power = self.magnitude ** 2
+        return self._power
+
+
+def mfcc_statistics(spec, n_mfcc=N_MFCC):
+    """Mean, std, max and min of each MFCC coefficient"""
+    return mel_mfcc_statistics(librosa.feature.melspectrogram(S=spec.power, sr=spec.sr), n_mfcc)
+
+
+def mel_mfcc_statistics(mel, n_mfcc=N_MFCC):
+    """MFCC statistics of a mel power spectrogram (power_to_db's floor is relative to its loudest bin)"""
+    mfccs = librosa.feature.mfcc(S=librosa.power_to_db(mel), n_mfcc=n_mfcc)
+
+    features = []
+    for i in range(mfccs.shape[0]):
+        features.extend([
+            np.mean(mfccs[i]),
+            np.std(mfccs[i]),
+            np.max(mfccs[i]),
+            np.min(mfccs[i])
+        ])
+    return features
+
+
+def dominant_pitches(pitches, magnitudes):
+    """piptrack pitch of the strongest bin in every frame (0 when unvoiced)"""
+    # Strongest bin of every frame in one pass instead of a per-frame Python loop
+    strongest_bins = magnitudes.argmax(axis=0)
+    return pitches[strongest_bins, np.arange(pitches.shape[1])]
+
+
+def pitch_statistics(pitches, magnitudes):
+    """Mean, std, max and min of the dominant piptrack pitch per frame (zeros when unvoiced)"""
+    return voiced_pitch_statistics(dominant_pitches(pitches, magnitudes))
+
+
+def voiced_pitch_statistics(frame_pitches):
+    voiced = frame_pitches[frame_pitches > 0]
+
+    if voiced.size == 0:
+        return [0, 0, 0, 0]
+
+    return [
+        np.mean(voiced),
+        np.std(voiced),
+        np.max(voiced),
+        np.min(voiced)
+    ]
+
+
+def spectral_frames(magnitude, sr):
+    """Spectral centroid and rolloff of every frame"""
+    spectral_centroids = librosa.feature.spectral_centroid(S=magnitude, sr=sr)[0]
+    spectral_rolloff = librosa.feature.spectral_rolloff(S=magnitude, sr=sr)[0]
+    return spectral_centroids, spectral_rolloff
+
+
+def spectral_statistics(spec):
+    """Mean and std of the spectral centroid and rolloff"""
+    return spectral_frame_statistics(*spectral_frames(spec.magnitude, spec.sr))
+
+
+def spectral_frame_statistics(spectral_centroids, spectral_rolloff):
+    return [
+        np.mean(spectral_centroids),
+        np.std(spectral_centroids),
+        np.mean(spectral_rolloff),
+        np.std(spectral_rolloff)
+    ]
+
+
+def formant_features(spec, n_frames=FORMANT_FRAMES):
+    """First two prominent bins of the opening frames (formant approximation), zero padded"""
+    return opening_formants(spec.magnitude[:, :n_frames], n_frames)
+
+
+def opening_formants(magnitude, n_frames=FORMANT_FRAMES):
+    """Formant approximation from the magnitude of a clip's first n_frames frames"""
+    features = []
+    for frame in range(min(n_frames, magnitude.shape[1])):
+        frame_mag = magnitude[:, frame]
+        peaks = np.where(frame_mag > np.mean(frame_mag) + np.std(frame_mag))[0]
+        if len(peaks) >= 2:
+            features.extend([peaks[0], peaks[1]])
+        else:
+            features.extend([0, 0])
+
+    # Pad or truncate to fixed size
+    features.extend([0] * (2 * n_frames - len(features)))
+    return features[:2 * n_frames]
+
+
+def extract_feature_vector(y, sr):
+    """Build the normalized voice feature vector from a single shared STFT
+
+    Layout (80 values, must stay stable for stored Student.voice_features):
+    13 MFCC x (mean, std, max, min), 4 pitch, 4 centroid/rolloff, 20 formant.
+    """
+    spec = SpectrogramCache(y, sr)
+
+    features = []
+    features.extend(mfcc_statistics(spec))
+
+    pitches, magnitudes = librosa.piptrack(S=spec.magnitude, sr=sr)
+    features.extend(pitch_statistics(pitches, magnitudes))
+
+    features.extend(spectral_statistics(spec))
+    features.extend(formant_features(spec))
+
+    return normalize_features(features)
+
+
+def normalize_features(features):
+    """Z-normalize the concatenated descriptors"""
+    features_array = np.array(features)
+
+    # Normalize features
+    if np.std(features_array) != 0:
+        features_array = (features_array - np.mean(features_array)) / np.std(features_array)
+
+    return features_array
+
+
+def analyse_voice_sample(audio_file):
+    """Decode, validate and extract features for one clip
+
+    Module level so it can run inside an extraction pool worker. Returns a dict
+    with 'valid', 'message' and 'features' (None unless extraction succeeded).
+    """
+    try:
+        audio = load_audio(audio_file)
+    except Exception as e:
+        return {'valid': False, 'message': f"Error processing audio file: {str(e)}", 'features': None}
+
+    try:
+        print(f"🎤 Starting enhanced voice feature extraction from: {audio.source}")
+
+        # Validate audio first (reuses the result if the caller already validated this clip)
+        valid, validation_message = validate_audio(audio)
+        if not valid:
+            print(f"❌ Audio validation failed: {validation_message}")
+            return {'valid': False, 'message': validation_message, 'features': None}
+
+        sr = audio.sr  # load_audio decoded the clip at FEATURE_SAMPLE_RATE
+        y = audio.y
+
+        # Drop non-speech frames before any descriptor is computed
+        speech = trim_to_speech(audio, y, sr)
+        print(f"📊 Audio loaded - Duration: {len(y)/sr:.2f}s, Speech: {len(speech)/sr:.2f}s, Sample Rate: {sr}Hz")
+        y = speech
+
+        # All spectral descriptors share one STFT of the clip
+        features_array = extract_feature_vector(y, sr)
+
+        print(f"✅ Enhanced feature extraction successful - Feature vector size: {len(features_array)}")
+        return {'valid': True, 'message': "Feature extraction successful", 'features': features_array}
+
+    except Exception as e:
+        error_msg = f"Error extracting enhanced features: {e}"
+        print(f"❌ {error_msg}")
+        return {'valid': True, 'message': error_msg, 'features': None}
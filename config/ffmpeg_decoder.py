@@ -0,0 +1,163 @@
+import atexit
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+
+import numpy as np
+from .constants import *
+
+# soxr precision (bits) of each RESAMPLE_QUALITY tier, for ffmpeg's soxr resampler
+SOXR_PRECISION = {'QQ': 15, 'LQ': 16, 'MQ': 16, 'HQ': 20, 'VHQ': 28}
+
+
+class FFmpegDecoder:
+    """Decodes formats libsndfile cannot read (M4A) with ffmpeg, straight into NumPy
+
+    ffmpeg writes mono float32 PCM at the requested rate to stdout, so no WAV is
+    ever written to disk. Processes are started ahead of time and wait on stdin,
+    which takes their start-up off the request path; a background thread starts
+    the replacements once a decode has used one. At most `size` decodes run at
+    once. MP4 files with the index at the end cannot be read from a pipe, so
+    those are retried from a temporary copy of the upload.
+    """
+
+    def __init__(self, binary=FFMPEG_BINARY, size=FFMPEG_POOL_SIZE, timeout=FFMPEG_TIMEOUT,
+                 sample_rate=FEATURE_SAMPLE_RATE):
+        self.binary = binary
+        self.size = size
+        self.timeout = timeout
+        self.sample_rate = sample_rate
+        self._idle = queue.Queue()  # started processes waiting for input on stdin
+        self._slots = threading.BoundedSemaphore(size)
+        self._resampler = None
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def is_available(self):
+        return shutil.which(self.binary) is not None
+
+    def _resample_filter(self):
+        """Use soxr when ffmpeg has it, so M4A clips are resampled like every other format"""
+        if self._resampler is None:
+            try:
+                buildconf = subprocess.run([self.binary, '-hide_banner', '-buildconf'], capture_output=True,
+                                           text=True, timeout=self.timeout).stdout
+            except Exception:
+                buildconf = ''
+            if '--enable-libsoxr' in buildconf:
+                self._resampler = f"aresample=resampler=soxr:precision={SOXR_PRECISION.get(RESAMPLE_QUALITY.upper(), 20)}"
+            else:
+                self._resampler = 'aresample'
+        return self._resampler
+
+    def _start(self, sr, input_path='pipe:0'):
+        from_pipe = input_path == 'pipe:0'
+        command = [self.binary, '-hide_banner', '-loglevel', 'error']
+        if not from_pipe:
+            command.append('-nostdin')
+        command += [
+            '-i', input_path, '-vn', '-ac', '1', '-af', self._resample_filter(), '-ar', str(sr),
+            '-f', 'f32le', '-acodec', 'pcm_f32le', 'pipe:1'
+        ]
+        return subprocess.Popen(command, stdin=subprocess.PIPE if from_pipe else subprocess.DEVNULL,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def _take_process(self, sr):
+        """An idle process for this rate (started earlier if possible)"""
+        if sr == self.sample_rate:
+            while True:
+                try:
+                    process = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if process.poll() is None:
+                    return process
+        return self._start(sr)
+
+    def _refill(self):
+        """Keep one started process per slot waiting for the next clip"""
+        with self._lock:
+            while self._idle.qsize() < self.size:
+                self._idle.put(self._start(self.sample_rate))
+
+    def _request_refill(self):
+        """Have the refill thread top up the idle processes, without waiting for it"""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Threads do not survive a fork - each Gunicorn worker starts its own
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run_refills, name="ffmpeg-refill", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _run_refills(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            try:
+                self._refill()
+            except Exception as e:
+                print(f"⚠️ Could not start ffmpeg processes ahead of time: {e}")
+
+    def _run(self, process, data=None):
+        try:
+            stdout, stderr = process.communicate(input=data, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise RuntimeError(f"ffmpeg did not finish decoding within {self.timeout:.0f}s")
+        return process.returncode, stdout, stderr.decode(errors='replace').strip()
+
+    def decode(self, source, sr=None, extension=None):
+        """Decode bytes or a file path to mono float32 samples at sr"""
+        if not self.is_available():
+            raise RuntimeError(f"{self.binary} is required to decode {extension or 'this'} audio")
+        sr = sr or self.sample_rate
+
+        if not self._slots.acquire(timeout=self.timeout):
+            raise RuntimeError("Audio decoder busy - please try again")
+        try:
+            if isinstance(source, (bytes, bytearray)):
+                returncode, stdout, error = self._run(self._take_process(sr), source)
+                if returncode != 0 or not stdout:
+                    # Not streamable from a pipe (e.g. MP4 index at the end) - let ffmpeg seek a copy
+                    print(f"🔄 {extension or 'Audio'} upload is not streamable - decoding a temporary copy")
+                    returncode, stdout, error = self._decode_copy(source, sr, extension)
+            else:
+                returncode, stdout, error = self._run(self._start(sr, source))
+
+            if returncode != 0 or not stdout:
+                raise RuntimeError(f"ffmpeg could not decode the audio: {error.splitlines()[-1] if error else 'no audio stream'}")
+            return np.frombuffer(stdout, dtype='<f4').copy()
+        finally:
+            self._slots.release()
+            self._request_refill()
+
+    def _decode_copy(self, data, sr, extension):
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.' + (extension or 'm4a'))
+        try:
+            temp_file.write(data)
+            temp_file.close()
+            return self._run(self._start(sr, temp_file.name))
+        finally:
+            os.remove(temp_file.name)
+
+    def close(self):
+        """Stop the idle processes"""
+        while True:
+            try:
+                process = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            process.kill()
+            process.wait()
+
+
+# Global instance - processes are only started once the first clip needs one
+ffmpeg_decoder = FFmpegDecoder()
+atexit.register(ffmpeg_decoder.close)
@@ -3,10 +3,30 @@ from flask_login import UserMixin
 from flask_bcrypt import Bcrypt
 from datetime import datetime
 import json
+import struct
+import numpy as np
 
 db = SQLAlchemy()
 bcrypt = Bcrypt()
 
+# Binary voiceprint layout: b'VP', format version, reserved byte, uint32 dimension,
+# then little-endian float32 values. The 8-byte header keeps the payload aligned.
+VOICEPRINT_HEADER = struct.Struct('<2sBxI')
+VOICEPRINT_MAGIC = b'VP'
+VOICEPRINT_VERSION = 1
+
+def encode_voiceprint(features):
+    """Pack a feature vector into the versioned float32 blob format"""
+    values = np.ascontiguousarray(features, dtype='<f4').ravel()
+    return VOICEPRINT_HEADER.pack(VOICEPRINT_MAGIC, VOICEPRINT_VERSION, len(values)) + values.tobytes()
+
+def decode_voiceprint(blob):
+    """Zero-copy view of a voiceprint blob as a read-only float32 array"""
+    magic, version, dimension = VOICEPRINT_HEADER.unpack_from(blob)
+    if magic != VOICEPRINT_MAGIC or version != VOICEPRINT_VERSION:
+        raise ValueError(f"Unsupported voiceprint format {magic!r} v{version}")
+    return np.frombuffer(blob, dtype='<f4', count=dimension, offset=VOICEPRINT_HEADER.size)
+
 class Teacher(UserMixin, db.Model):
     """Teacher model for authentication"""
     __tablename__ = 'teachers'
@@ -47,7 +67,8 @@ class Student(db.Model):
     student_id = db.Column(db.String(50), nullable=False, index=True)
     student_name = db.Column(db.String(100), nullable=False)
     teacher_id = db.Column(db.Integer, db.ForeignKey('teachers.id'), nullable=False)
-    voice_features = db.Column(db.Text)  # JSON string of voice features
+    voice_features = db.Column(db.Text)  # Legacy JSON string of voice features (pre-binary rows)
+    voice_embedding = db.Column(db.LargeBinary)  # Versioned float32 voiceprint blob
     voice_sample_url = db.Column(db.String(500))  # Cloudinary URL
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
@@ -59,15 +80,22 @@ class Student(db.Model):
     attendance_records = db.relationship('AttendanceRecord', backref='student', lazy=True)
     
     def set_voice_features(self, features):
-        """Store voice features as JSON"""
-        self.voice_features = json.dumps(features.tolist() if hasattr(features, 'tolist') else features)
+        """Store voice features as a binary float32 voiceprint"""
+        self.voice_embedding = encode_voiceprint(features) if len(features) else None
+        self.voice_features = None
     
     def get_voice_features(self):
-        """Retrieve voice features from JSON"""
+        """Retrieve voice features as a float32 array (falls back to legacy JSON rows)"""
+        if self.voice_embedding:
+            return decode_voiceprint(self.voice_embedding)
         if self.voice_features:
-            return json.loads(self.voice_features)
+            return np.array(json.loads(self.voice_features), dtype=np.float32)
         return None
     
+    @property
+    def has_voice_features(self):
+        return bool(self.voice_embedding or self.voice_features)
+    
     def __repr__(self):
         return f'<Student {self.student_id}: {self.student_name}>'
 
@@ -82,8 +110,16 @@ class AttendanceRecord(db.Model):
     confidence_score = db.Column(db.Float)
     voice_sample_url = db.Column(db.String(500))  # Cloudinary URL for verification
     ip_address = db.Column(db.String(45))
+    device = db.Column(db.String(255))  # User-Agent of the marking request
+    processing_ms = db.Column(db.Integer)  # request start to record insert
     status = db.Column(db.String(20), default='present')  # present, late, etc.
     
+    # Duplicate checks look up one student's day, reports one teacher's day (or range)
+    __table_args__ = (
+        db.Index('ix_attendance_student_timestamp', 'student_id', 'timestamp'),
+        db.Index('ix_attendance_teacher_timestamp', 'teacher_id', 'timestamp'),
+    )
+    
     def __repr__(self):
         return f'<AttendanceRecord {self.student.student_id} at {self.timestamp}>'
 
@@ -99,6 +135,11 @@ class SecurityLog(db.Model):
     ip_address = db.Column(db.String(45))
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     
+    # Security pages walk one teacher's events newest first, keyed by (timestamp, id)
+    __table_args__ = (
+        db.Index('ix_security_teacher_timestamp_id', 'teacher_id', 'timestamp', 'id'),
+    )
+    
     def to_dict(self):
         """Convert to dictionary for JSON serialization"""
         return {
@@ -113,3 +154,36 @@ class SecurityLog(db.Model):
     
     def __repr__(self):
         return f'<SecurityLog {self.event_type} at {self.timestamp}>'
+
+
+def upgrade_schema():
+    """Add columns and indexes introduced after a table was first created (create_all only adds missing tables)"""
+    from sqlalchemy import inspect
+    
+    # Nullable columns added to existing tables, oldest first
+    added_columns = (
+        (Student, 'voice_embedding'),
+        (AttendanceRecord, 'device'),
+        (AttendanceRecord, 'processing_ms'),
+    )
+    for model, name in added_columns:
+        try:
+            columns = {column['name'] for column in inspect(db.engine).get_columns(model.__tablename__)}
+            if name not in columns:
+                column_type = model.__table__.columns[name].type.compile(dialect=db.engine.dialect)
+                with db.engine.begin() as connection:
+                    connection.execute(db.text(f'ALTER TABLE {model.__tablename__} ADD COLUMN {name} {column_type}'))
+                print(f"✅ Added {model.__tablename__}.{name} column")
+        except Exception as e:
+            # Another worker may have upgraded the table at the same time
+            print(f"⚠️ Schema upgrade warning: {e}")
+    
+    for model in (AttendanceRecord, SecurityLog):
+        try:
+            existing = {index['name'] for index in inspect(db.engine).get_indexes(model.__tablename__)}
+            for index in model.__table__.indexes:
+                if index.name not in existing:
+                    index.create(bind=db.engine, checkfirst=True)
+                    print(f"✅ Added index {index.name}")
+        except Exception as e:
+            print(f"⚠️ Schema upgrade warning: {e}")
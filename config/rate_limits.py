@@ -0,0 +1,166 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+from .constants import *
+
+
+class MemoryWindowStore:
+    """Recent event times per key (rate limits, failed attempts) for one process
+
+    Each key keeps at most max_events timestamps in a deque; expired ones are
+    dropped from the front as keys are counted. Keys are ordered by their last
+    event, so an occasional sweep removes idle keys from the front, and the
+    oldest keys are evicted beyond max_keys to keep memory flat.
+    """
+
+    backend = 'memory'
+
+    def __init__(self, horizon, max_keys=RATE_LIMIT_MAX_KEYS, max_events=RATE_LIMIT_MAX_EVENTS,
+                 sweep_interval=RATE_LIMIT_SWEEP_INTERVAL):
+        self.horizon = horizon
+        self.max_keys = max_keys
+        self.max_events = max_events
+        self.sweep_interval = sweep_interval
+        self.evicted = 0
+        self._events = OrderedDict()  # key -> deque of timestamps, least recently hit first
+        self._next_sweep = time.time() + sweep_interval
+        self._lock = threading.Lock()
+
+    def hit(self, key, now=None):
+        """Record an event for key"""
+        now = now or time.time()
+        with self._lock:
+            events = self._events.get(key)
+            if events is None:
+                events = self._events[key] = deque(maxlen=self.max_events)
+            else:
+                self._events.move_to_end(key)
+            events.append(now)
+
+            while len(self._events) > self.max_keys:
+                self._events.popitem(last=False)
+                self.evicted += 1
+            if now >= self._next_sweep:
+                self._sweep(now)
+
+    def count(self, key, window, now=None, limit=None):
+        """Events for key in the last `window` seconds (stops counting at limit)"""
+        cutoff = (now or time.time()) - window
+        with self._lock:
+            events = self._events.get(key)
+            if events is None:
+                return 0
+            while events and events[0] < cutoff:
+                events.popleft()
+            if not events:
+                del self._events[key]
+                return 0
+            return len(events) if limit is None else min(len(events), limit)
+
+    def _sweep(self, now):
+        """Drop keys with no event inside the horizon (they sit at the front)"""
+        cutoff = now - self.horizon
+        while self._events:
+            key, events = next(iter(self._events.items()))
+            if events[-1] >= cutoff:
+                break
+            del self._events[key]
+        self._next_sweep = now + self.sweep_interval
+
+    def status(self):
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'keys': len(self._events),
+                'max_keys': self.max_keys,
+                'evicted': self.evicted
+            }
+
+
+class SQLiteWindowStore:
+    """The same counters in a SQLite file shared by every Gunicorn worker on the host
+
+    Keeps rate limits consistent whichever worker handles a request. Rows older
+    than the horizon are deleted by periodic sweeps, and each key keeps at most
+    max_events rows.
+    """
+
+    backend = 'sqlite'
+
+    def __init__(self, horizon, db_path=RATE_LIMIT_DB, max_events=RATE_LIMIT_MAX_EVENTS,
+                 sweep_interval=RATE_LIMIT_SWEEP_INTERVAL):
+        self.horizon = horizon
+        self.db_path = db_path
+        self.max_events = max_events
+        self.sweep_interval = sweep_interval
+        self.errors = 0
+        self._db = None
+        self._db_pid = None
+        self._next_sweep = 0
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        """This process's SQLite connection (reopened after a fork)"""
+        if self._db is None or self._db_pid != os.getpid():
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS window_events (key TEXT NOT NULL, ts REAL NOT NULL)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS idx_window_events_key_ts ON window_events (key, ts)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS idx_window_events_ts ON window_events (ts)')
+            self._db_pid = os.getpid()
+        return self._db
+
+    def hit(self, key, now=None):
+        now = now or time.time()
+        try:
+            with self._lock:
+                db = self._connection()
+                db.execute('INSERT INTO window_events (key, ts) VALUES (?, ?)', (key, now))
+                # Only the newest max_events rows of a key can matter
+                db.execute(
+                    'DELETE FROM window_events WHERE key = ? AND ts < '
+                    '(SELECT ts FROM window_events WHERE key = ? ORDER BY ts DESC LIMIT 1 OFFSET ?)',
+                    (key, key, self.max_events - 1)
+                )
+                if now >= self._next_sweep:
+                    db.execute('DELETE FROM window_events WHERE ts < ?', (now - self.horizon,))
+                    self._next_sweep = now + self.sweep_interval
+                db.commit()
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"⚠️ Rate limit store write failed: {e}")
+
+    def count(self, key, window, now=None, limit=None):
+        cutoff = (now or time.time()) - window
+        try:
+            with self._lock:
+                return self._connection().execute(
+                    'SELECT COUNT(*) FROM (SELECT 1 FROM window_events WHERE key = ? AND ts >= ? LIMIT ?)',
+                    (key, cutoff, -1 if limit is None else limit)
+                ).fetchone()[0]
+        except sqlite3.Error as e:
+            # Fail open - a broken store must not block attendance
+            self.errors += 1
+            print(f"⚠️ Rate limit store read failed: {e}")
+            return 0
+
+    def status(self):
+        try:
+            with self._lock:
+                keys = self._connection().execute('SELECT COUNT(DISTINCT key) FROM window_events').fetchone()[0]
+        except sqlite3.Error:
+            keys = None
+        return {'backend': self.backend, 'keys': keys, 'errors': self.errors}
+
+
+def create_window_store(horizon, backend=RATE_LIMIT_BACKEND):
+    """Window store for RATE_LIMIT_BACKEND ('memory' or 'sqlite')"""
+    if backend == 'sqlite':
+        return SQLiteWindowStore(horizon)
+    return MemoryWindowStore(horizon)
@@ -1,16 +1,89 @@
-from flask import Flask, render_template, request, jsonify, Blueprint, current_app
+from flask import Flask, render_template, request, jsonify, Blueprint, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
-from .voicerecognition import voice_system,MAX_AUDIO_DURATION,MIN_AUDIO_DURATION,MIN_VOICE_THRESHOLD,ALLOWED_EXTENSIONS
+from .voicerecognition import voice_system,MAX_AUDIO_DURATION,MIN_AUDIO_DURATION,MIN_VOICE_THRESHOLD,ALLOWED_EXTENSIONS,MAX_BATCH_ATTENDANCE,STREAM_CHUNK_SECONDS,MAX_REPORT_DAYS,SECURITY_PAGE_SIZE,SECURITY_PAGE_MAX,FEATURE_VERSION
 from .models import db, Student, Teacher
+import csv
+import io
 import json
 from .security import allowed_file
 from .cloudinary_service import cloudinary_service
+from .extraction_pool import extraction_pool, ExtractionPoolBusy
+from .upload_queue import upload_queue
+from .feature_cache import feature_cache
+from .audit_log import audit_log
+from .dashboard_stats import dashboard_stats
+from .db_pool import pool_monitor
+from .audio_processing import AudioUpload
+from .audio_stream import audio_streams, stream_owner, StreamError
 from werkzeug.utils import secure_filename
 import os
+import time
 from datetime import datetime
 
 config = Blueprint('config', __name__, template_folder='../templates')
 
+def busy_response(error):
+    """Retryable response when the feature extraction pool is saturated"""
+    print(f"⏳ Extraction pool busy: {error}")
+    response = jsonify({'success': False, 'busy': True, 'message': str(error)})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+def request_metadata():
+    """Request details stored on attendance records (taken when the route starts, for processing_ms)"""
+    return {
+        'ip_address': request.environ.get('REMOTE_ADDR', 'unknown'),
+        'device': (request.headers.get('User-Agent') or '')[:255] or None,
+        'started_at': time.perf_counter()
+    }
+
+def attendance_summary_of(record):
+    """The created attendance record as returned to the client"""
+    if record is None:
+        return None
+    return {
+        'id': record.id,
+        'timestamp': record.timestamp.isoformat(),
+        'confidence': round(record.confidence_score, 4)
+    }
+
+def request_audio(missing_message, teacher_id):
+    """The request's voice sample: a finished recording stream of the teacher or an uploaded file
+    
+    Returns (audio, None), or (None, error response) when it is missing or unusable.
+    """
+    stream_id = request.form.get('stream_id')
+    if stream_id:
+        audio = audio_streams.finish(stream_id, teacher_id)
+        if audio is None:
+            return None, (jsonify({
+                'success': False,
+                'stream_expired': True,
+                'message': 'Recording stream expired. Please record again.'
+            }), 404)
+        return audio, None
+    
+    audio_file = None
+    if 'recorded_audio' in request.files and request.files['recorded_audio'].filename:
+        audio_file = request.files['recorded_audio']
+    elif 'voice_sample' in request.files and request.files['voice_sample'].filename:
+        audio_file = request.files['voice_sample']
+    
+    if not audio_file:
+        return None, (jsonify({'success': False, 'message': missing_message}), 400)
+    
+    if not allowed_file(audio_file.filename):
+        return None, (jsonify({
+            'success': False, 
+            'message': 'Invalid file format. Please upload WAV, MP3, or M4A files.'
+        }), 400)
+    
+    # Keep the upload in memory - it is decoded and uploaded from the same buffer
+    audio = AudioUpload.from_file_storage(audio_file)
+    if not audio.data:
+        return None, (jsonify({'success': False, 'message': 'Failed to process audio file'}), 400)
+    return audio, None
+
 @config.route('/welcome')
 def welcome():
     """Landing page for new users and students"""
@@ -20,13 +93,12 @@ def welcome():
 @login_required
 def index():
     """Main dashboard with security overview - Teachers only"""
-    students = voice_system.get_all_students()
-    today_attendance = voice_system.get_attendance_report()
-    security_events = voice_system.get_security_report(1)  # Last 24 hours
+    students, today_attendance = voice_system.get_day_overview()
+    stats = dashboard_stats.get(current_user.id)
     return render_template('index.html', 
                          students=students, 
                          attendance=today_attendance,
-                         security_events_count=len(security_events),
+                         security_events_count=stats['events_today'],
                          teacher=current_user)
 
 @config.route('/enroll')
@@ -61,53 +133,31 @@ def enroll_student():
         if len(student_id) < 3 or len(student_name) < 2:
             return jsonify({'success': False, 'message': 'Student ID and name must be valid'}), 400
         
-        # Check for audio file
-        audio_file = None
-        if 'recorded_audio' in request.files and request.files['recorded_audio'].filename:
-            audio_file = request.files['recorded_audio']
-        elif 'voice_sample' in request.files and request.files['voice_sample'].filename:
-            audio_file = request.files['voice_sample']
+        # Recorded stream or uploaded file
+        audio, error = request_audio('Voice sample is required for enrollment', teacher.id)
+        if error:
+            return error
         
-        if not audio_file:
-            return jsonify({'success': False, 'message': 'Voice sample is required for enrollment'}), 400
+        # Temporarily set current user context for enrollment
+        from flask_login import login_user, logout_user
+        was_authenticated = current_user.is_authenticated
         
-        if audio_file and allowed_file(audio_file.filename):
-            # Save temporary file
-            temp_file_path = cloudinary_service.save_temp_file(audio_file)
-            if not temp_file_path:
-                return jsonify({'success': False, 'message': 'Failed to process audio file'}), 400
-            
-            try:
-                # Temporarily set current user context for enrollment
-                from flask_login import login_user, logout_user
-                was_authenticated = current_user.is_authenticated
-                current_teacher = current_user if was_authenticated else None
-                
-                if not was_authenticated:
-                    login_user(teacher, remember=False)
-                
-                success, message = voice_system.enroll_student(student_id, student_name, temp_file_path)
-                
-                # Restore authentication state
-                if not was_authenticated:
-                    logout_user()
-                    if current_teacher:
-                        login_user(current_teacher, remember=False)
-                
-            finally:
-                # Clean up temporary file
-                cloudinary_service.cleanup_temp_file(temp_file_path)
-            
-            return jsonify({
-                'success': success,
-                'message': message
-            })
-        else:
-            return jsonify({
-                'success': False, 
-                'message': 'Invalid file format. Please upload WAV, MP3, or M4A files.'
-            }), 400
+        if not was_authenticated:
+            login_user(teacher, remember=False)
+        try:
+            success, message = voice_system.enroll_student(student_id, student_name, audio)
+        finally:
+            # Restore authentication state on every exit - a busy pool or an error must not leave the caller logged in
+            if not was_authenticated:
+                logout_user()
+        
+        return jsonify({
+            'success': success,
+            'message': message
+        })
     
+    except ExtractionPoolBusy as e:
+        return busy_response(e)
     except Exception as e:
         print(f"❌ Error in enroll_student: {e}")
         return jsonify({
@@ -127,82 +177,293 @@ def attendance_page():
 def mark_attendance():
     """Handle attendance marking - Teachers only"""
     try:
+        metadata = request_metadata()
         student_id = request.form.get('student_id')
-        client_ip = request.environ.get('REMOTE_ADDR', 'unknown')
+        client_ip = metadata['ip_address']
         
         print(f"📝 Attendance request from {client_ip} for Student ID: {student_id}")
        
         if not student_id:
             return jsonify({'success': False, 'message': 'Please select a student'}), 400
         
-        # Check for audio file
-        audio_file = None
-        if 'recorded_audio' in request.files and request.files['recorded_audio'].filename:
-            audio_file = request.files['recorded_audio']
-        elif 'voice_sample' in request.files and request.files['voice_sample'].filename:
-            audio_file = request.files['voice_sample']
+        # Recorded stream or uploaded file
+        audio, error = request_audio('Voice sample is required for attendance', current_user.id)
+        if error:
+            return error
         
-        if not audio_file:
-            return jsonify({'success': False, 'message': 'Voice sample is required for attendance'}), 400
+        # IP, device and timing are written with the record itself
+        success, message, record = voice_system.mark_attendance(student_id, audio, metadata)
         
-        if audio_file and allowed_file(audio_file.filename):
-            # Save temporary file
-            temp_file_path = cloudinary_service.save_temp_file(audio_file)
-            if not temp_file_path:
-                return jsonify({'success': False, 'message': 'Failed to process audio file'}), 400
-            
-            try:
-                success, message = voice_system.mark_attendance(student_id, temp_file_path)
-                
-                # Set IP address in the last attendance record if successful
-                if success:
-                    from .models import AttendanceRecord
-                    recent_record = AttendanceRecord.query.filter_by(
-                        teacher_id=current_user.id
-                    ).order_by(AttendanceRecord.timestamp.desc()).first()
-                    
-                    if recent_record:
-                        recent_record.ip_address = client_ip
-                        db.session.commit()
-                        
-            finally:
-                # Clean up temporary file
-                cloudinary_service.cleanup_temp_file(temp_file_path)
-            
-            return jsonify({'success': success, 'message': message})
-        else:
+        return jsonify({'success': success, 'message': message, 'attendance': attendance_summary_of(record)})
+    
+    except ExtractionPoolBusy as e:
+        return busy_response(e)
+    except Exception as e:
+        print(f"❌ Error in mark_attendance: {e}")
+        return jsonify({
+            'success': False,
+            'message': f'An error occurred while marking attendance'
+        }), 500
+
+@config.route('/api/attendance/identify', methods=['POST'])
+@login_required
+def identify_attendance():
+    """Identify the speaker among enrolled students and mark attendance - Teachers only"""
+    try:
+        metadata = request_metadata()
+        client_ip = metadata['ip_address']
+        
+        print(f"📝 Identification request from {client_ip}")
+        
+        # Recorded stream or uploaded file
+        audio, error = request_audio('Voice sample is required for attendance', current_user.id)
+        if error:
+            return error
+        
+        success, message, candidates, record = voice_system.identify_and_mark_attendance(audio, metadata=metadata)
+        
+        return jsonify({
+            'success': success,
+            'message': message,
+            'student_id': candidates[0]['student_id'] if success else None,
+            'attendance': attendance_summary_of(record),
+            'candidates': [
+                {'student_id': c['student_id'], 'name': c['name'], 'confidence': round(c['score'], 4)}
+                for c in candidates
+            ]
+        })
+    
+    except ExtractionPoolBusy as e:
+        return busy_response(e)
+    except Exception as e:
+        print(f"❌ Error in identify_attendance: {e}")
+        return jsonify({
+            'success': False,
+            'message': f'An error occurred while identifying the student'
+        }), 500
+
+@config.route('/api/attendance/batch', methods=['POST'])
+@login_required
+def mark_attendance_batch():
+    """Mark attendance for a whole class in one request - Teachers only
+    
+    Expects repeated 'student_id' form fields paired, in order, with repeated
+    'voice_sample' files.
+    """
+    try:
+        metadata = request_metadata()
+        student_ids = request.form.getlist('student_id')
+        audio_files = request.files.getlist('voice_sample')
+        client_ip = metadata['ip_address']
+        
+        print(f"📝 Batch attendance request from {client_ip} for {len(student_ids)} students")
+        
+        if not student_ids:
+            return jsonify({'success': False, 'message': 'Please select at least one student'}), 400
+        
+        if len(student_ids) != len(audio_files):
+            return jsonify({'success': False, 'message': 'Each student needs exactly one voice sample'}), 400
+        
+        if len(student_ids) > MAX_BATCH_ATTENDANCE:
+            return jsonify({
+                'success': False, 
+                'message': f'Too many students in one batch. Maximum {MAX_BATCH_ATTENDANCE} allowed.'
+            }), 400
+        
+        if not all(audio_file.filename and allowed_file(audio_file.filename) for audio_file in audio_files):
             return jsonify({
                 'success': False, 
                 'message': 'Invalid file format. Please upload WAV, MP3, or M4A files.'
             }), 400
+        
+        entries = []
+        for student_id, audio_file in zip(student_ids, audio_files):
+            audio = AudioUpload.from_file_storage(audio_file)
+            if not audio.data:
+                return jsonify({'success': False, 'message': f'Failed to process audio file for {student_id}'}), 400
+            entries.append((student_id, audio))
+        
+        results = voice_system.mark_attendance_batch(entries, metadata)
+        
+        return jsonify({
+            'success': True,
+            'marked': sum(1 for result in results if result['success']),
+            'results': results
+        })
     
+    except ExtractionPoolBusy as e:
+        return busy_response(e)
     except Exception as e:
-        print(f"❌ Error in mark_attendance: {e}")
+        print(f"❌ Error in mark_attendance_batch: {e}")
         return jsonify({
             'success': False,
             'message': f'An error occurred while marking attendance'
         }), 500
 
+@config.route('/api/stream/start', methods=['POST'])
+def start_stream():
+    """Open a live recording stream - Teachers, or the public enrollment page with a teacher reference"""
+    try:
+        teacher_id = request.form.get('teacher_id', type=int)
+        if teacher_id:
+            teacher = Teacher.query.get(teacher_id)
+            if not teacher or not teacher.is_active:
+                return jsonify({'success': False, 'message': 'Invalid teacher reference'}), 403
+        elif current_user.is_authenticated:
+            teacher_id = current_user.id
+        else:
+            return jsonify({'success': False, 'message': 'Please log in or use an enrollment link'}), 403
+        
+        stream_id = audio_streams.start(teacher_id)
+        return jsonify({
+            'success': True,
+            'stream_id': stream_id,
+            'sample_rate': audio_streams.sample_rate,
+            'chunk_seconds': STREAM_CHUNK_SECONDS,
+            'max_duration': MAX_AUDIO_DURATION
+        })
+    except StreamError as e:
+        return jsonify({'success': False, 'message': str(e)}), e.status
+    except Exception as e:
+        print(f"❌ Error in start_stream: {e}")
+        return jsonify({'success': False, 'message': 'Could not start recording stream'}), 500
+
+@config.route('/api/stream/<stream_id>/chunk', methods=['POST'])
+def stream_chunk(stream_id):
+    """Append raw 16-bit PCM to a live recording at the byte offset given in ?offset=
+    
+    Only the stream's teacher, or the enrollment page passing the same ?teacher_id=, may add to it.
+    """
+    try:
+        owner = stream_owner(stream_id)
+        if owner is None:
+            return jsonify({'success': False, 'message': 'Invalid recording stream'}), 404
+        if owner != request.args.get('teacher_id', type=int) and not (
+                current_user.is_authenticated and current_user.id == owner):
+            return jsonify({'success': False, 'message': 'Not allowed to add to this recording'}), 403
+        
+        offset = request.args.get('offset', type=int)
+        if offset is None:
+            return jsonify({'success': False, 'message': 'Chunk offset is required'}), 400
+        
+        received = audio_streams.append(stream_id, offset, request.get_data())
+        return jsonify({'success': True, 'received': received})
+    
+    except StreamError as e:
+        return jsonify({'success': False, 'message': str(e), 'received': e.received}), e.status
+    except Exception as e:
+        print(f"❌ Error in stream_chunk: {e}")
+        return jsonify({'success': False, 'message': 'Could not store audio chunk'}), 500
+
 @config.route('/reports')
 @login_required
 def reports_page():
     """Enhanced reports page with security information - Teachers only"""
     date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
-    attendance = voice_system.get_attendance_report(date)
-    all_students = voice_system.get_all_students()
-    security_events = voice_system.get_security_report(7)  # Last 7 days
+    all_students, attendance = voice_system.get_day_overview(date)
     return render_template('reports.html', 
                          attendance=attendance, 
                          date=date, 
-                         all_students=all_students,
-                         security_events=security_events)
+                         all_students=all_students)
+
+@config.route('/api/attendance/summary')
+@login_required
+def attendance_summary():
+    """Days present per student between ?start= and ?end= (YYYY-MM-DD, inclusive) - Teachers only"""
+    try:
+        today = datetime.now().strftime('%Y-%m-%d')
+        start_date = datetime.strptime(request.args.get('start', today), '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.args.get('end', today), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Dates must be given as YYYY-MM-DD'}), 400
+    
+    days = (end_date - start_date).days + 1
+    if days < 1:
+        return jsonify({'success': False, 'message': 'The end date must not be before the start date'}), 400
+    if days > MAX_REPORT_DAYS:
+        return jsonify({'success': False, 'message': f'Reports can cover at most {MAX_REPORT_DAYS} days'}), 400
+    
+    students = voice_system.get_attendance_summary(start_date, end_date)
+    return jsonify({
+        'success': True,
+        'start': start_date.isoformat(),
+        'end': end_date.isoformat(),
+        'days': days,
+        'total_records': sum(student['days_present'] for student in students),
+        'students': students
+    })
 
 @config.route('/security')
 @login_required
 def security_page():
     """Security dashboard - Teachers only"""
-    security_events = voice_system.get_security_report(30)  # Last 30 days
-    return render_template('security.html', security_events=security_events)
+    # First page only - the rest is fetched from /api/security/events as the list is scrolled
+    security_events, next_cursor = voice_system.get_security_events(30, SECURITY_PAGE_SIZE)
+    return render_template('security.html',
+                         security_events=security_events,
+                         event_counts=voice_system.get_security_event_counts(30),
+                         next_cursor=next_cursor)
+
+@config.route('/api/security/events')
+@login_required
+def security_events_page():
+    """Keyset-paginated security events, newest first - Teachers only
+    
+    Query: days (default 30), limit, event_type, and cursor from the previous page's next_cursor.
+    """
+    try:
+        days = int(request.args.get('days', 30))
+        limit = min(max(int(request.args.get('limit', SECURITY_PAGE_SIZE)), 1), SECURITY_PAGE_MAX)
+        events, next_cursor = voice_system.get_security_events(
+            days, limit, request.args.get('cursor') or None, request.args.get('event_type') or None
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid request: {e}'}), 400
+    
+    return jsonify({'success': True, 'events': events, 'next_cursor': next_cursor})
+
+@config.route('/api/security/export')
+@login_required
+def export_security_events():
+    """Stream security events as CSV (default) or JSON lines without building the whole list - Teachers only"""
+    try:
+        days = int(request.args.get('days', 30))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'days must be a number'}), 400
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'jsonl'):
+        return jsonify({'success': False, 'message': 'format must be csv or jsonl'}), 400
+    
+    events = voice_system.iter_security_events(days, request.args.get('event_type') or None)
+    
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['Timestamp', 'Event Type', 'Student ID', 'Details', 'IP Address'])
+        for count, event in enumerate(events, 1):
+            writer.writerow([event['timestamp'], event['event_type'], event['student_id'] or '',
+                             event['details'] or '', event['ip_address'] or ''])
+            if count % 500 == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    def generate_jsonl():
+        lines = []
+        for event in events:
+            lines.append(json.dumps(event) + '\n')
+            if len(lines) == 500:
+                yield ''.join(lines)
+                lines = []
+        yield ''.join(lines)
+    
+    filename = f"security_report_{datetime.now().strftime('%Y-%m-%d')}.{export_format}"
+    return Response(
+        stream_with_context(generate_csv() if export_format == 'csv' else generate_jsonl()),
+        mimetype='text/csv' if export_format == 'csv' else 'application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
 
 # Teacher sharing route
 @config.route('/share_link')
@@ -221,21 +482,19 @@ def share_link():
 def system_status():
     """Enhanced API endpoint with security status"""
     try:
-        students = voice_system.get_all_students()
-        attendance_today = voice_system.get_attendance_report()
-        security_events_today = voice_system.get_security_report(1)
-        
-        # Security statistics
-        failed_attempts = sum(1 for event in security_events_today 
-                            if event['event_type'] in ['FAILED_VOICE_VERIFICATION', 'SUSPICIOUS_ACTIVITY_DETECTED'])
+        # Counters maintained per teacher instead of loading today's rows
+        if current_user.is_authenticated:
+            stats = dashboard_stats.get(current_user.id)
+        else:
+            stats = {'enrolled': 0, 'attendance_today': 0, 'events_today': 0, 'failed_today': 0}
         
         status = {
             'system_ready': True,
-            'enrolled_students': len(students),
-            'attendance_today': len(attendance_today),
+            'enrolled_students': stats['enrolled'],
+            'attendance_today': stats['attendance_today'],
             'security': {
-                'events_today': len(security_events_today),
-                'failed_attempts_today': failed_attempts,
+                'events_today': stats['events_today'],
+                'failed_attempts_today': stats['failed_today'],
                 'voice_threshold': MIN_VOICE_THRESHOLD,
                 'min_audio_duration': MIN_AUDIO_DURATION,
                 'max_audio_duration': MAX_AUDIO_DURATION
@@ -243,8 +502,16 @@ def system_status():
             'configuration': {
                 'allowed_extensions': list(ALLOWED_EXTENSIONS),
                 'max_file_size_mb': current_app.config.get('MAX_CONTENT_LENGTH', 16*1024*1024) / (1024 * 1024),
-                'feature_version': '2.0'
-            }
+                'feature_version': FEATURE_VERSION
+            },
+            'extraction_pool': extraction_pool.status(),
+            'upload_queue': upload_queue.status(),
+            'audio_streams': audio_streams.status(),
+            'feature_cache': feature_cache.status(),
+            'audit_log': audit_log.status(),
+            'rate_limits': voice_system.security_manager.windows.status(),
+            'dashboard_stats': dashboard_stats.status(),
+            'database_pool': pool_monitor.status(db.engine.pool)
         }
         
         return jsonify(status)
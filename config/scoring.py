@@ -0,0 +1,62 @@
+import numpy as np
+
+# Weights of the combined similarity used for every verification decision
+COSINE_WEIGHT = 0.7
+EUCLIDEAN_WEIGHT = 0.3
+
+
+class TemplateSet:
+    """Stored voiceprints prepared once for repeated scoring (unit rows plus norms)"""
+
+    def __init__(self, vectors, dtype=np.float32):
+        self.vectors = np.ascontiguousarray(vectors, dtype=dtype)
+        self.norms = np.sqrt(np.einsum('ij,ij->i', self.vectors, self.vectors))
+
+        safe_norms = np.where(self.norms > 0, self.norms, 1.0).astype(dtype)
+        self.unit_vectors = np.ascontiguousarray(self.vectors / safe_norms[:, None])
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    @property
+    def dimension(self):
+        return self.vectors.shape[1]
+
+
+def score_pair(probe, template):
+    """Cosine similarity, Euclidean similarity and combined score of one probe/template pair
+
+    Plain float64 dot products - same values as sklearn's cosine_similarity plus
+    np.linalg.norm, without the input validation and 2-D wrapping per call.
+    """
+    probe = np.asarray(probe, dtype=np.float64)
+    template = np.asarray(template, dtype=np.float64)
+
+    norm_product = np.sqrt(np.dot(probe, probe) * np.dot(template, template))
+    cosine = float(np.dot(probe, template) / norm_product) if norm_product > 0 else 0.0
+
+    difference = probe - template
+    euclidean = float(1 / (1 + np.sqrt(np.dot(difference, difference))))  # Convert distance to similarity
+
+    return cosine, euclidean, COSINE_WEIGHT * cosine + EUCLIDEAN_WEIGHT * euclidean
+
+
+def score_templates(probe, templates):
+    """Cosine, Euclidean and combined scores of one probe against every template at once
+
+    One matrix-vector product against the unit rows gives |q| cos for every
+    template; the distances reuse it through |q - s|^2 = |q|^2 + |s|^2 - 2 q.s.
+    """
+    probe = np.asarray(probe, dtype=templates.vectors.dtype)
+    probe_norm = np.sqrt(np.dot(probe, probe))
+
+    projections = templates.unit_vectors @ probe
+    if probe_norm > 0:
+        cosine = projections / probe_norm
+    else:
+        cosine = np.zeros(len(templates), dtype=projections.dtype)
+
+    squared = probe_norm ** 2 + templates.norms ** 2 - 2 * projections * templates.norms
+    euclidean = 1 / (1 + np.sqrt(np.maximum(squared, 0)))
+
+    return cosine, euclidean, COSINE_WEIGHT * cosine + EUCLIDEAN_WEIGHT * euclidean
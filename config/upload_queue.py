@@ -0,0 +1,369 @@
+import glob
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines - single process, no cross-worker claims
+    fcntl = None
+
+from .constants import *
+from .models import db, Student, AttendanceRecord
+from .audio_processing import AudioUpload
+from .cloudinary_service import cloudinary_service
+
+RECORD_MODELS = {'student': Student, 'attendance': AttendanceRecord}
+
+
+class LocalUploader:
+    """Stand-in for Cloudinary that copies samples into a local directory
+
+    Used for tests and offline runs (UPLOAD_BACKEND=local). fail_times makes the
+    first uploads fail so the retry path can be exercised.
+    """
+
+    def __init__(self, directory=UPLOAD_LOCAL_DIR, fail_times=0):
+        self.directory = directory
+        self.fail_times = fail_times
+        self._lock = threading.Lock()
+
+    def is_available(self):
+        return True
+
+    def upload_voice_sample(self, file_path, student_id, teacher_id, purpose='enrollment'):
+        """Copy the sample into teacher_<id>/ and return a Cloudinary-shaped result"""
+        with self._lock:
+            if self.fail_times > 0:
+                self.fail_times -= 1
+                return {'success': False, 'error': 'Simulated upload failure', 'fallback': True, 'retryable': True}
+
+        try:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            name = f"{student_id}_{purpose}_{timestamp}_{uuid.uuid4().hex[:8]}{os.path.splitext(file_path)[1]}"
+            folder = os.path.join(self.directory, f"teacher_{teacher_id}")
+            os.makedirs(folder, exist_ok=True)
+            target = shutil.copyfile(file_path, os.path.join(folder, name))
+
+            return {
+                'success': True,
+                'url': f"file://{os.path.abspath(target)}",
+                'public_id': f"voice_samples/{teacher_id}/{os.path.splitext(name)[0]}",
+                'format': os.path.splitext(name)[1].lstrip('.') or 'unknown'
+            }
+        except Exception as e:
+            return {'success': False, 'error': str(e), 'fallback': True, 'retryable': True}
+
+
+class UploadQueue:
+    """Voice sample uploads handled by background threads instead of the request
+
+    Routes commit the Student/AttendanceRecord row first and enqueue the sample;
+    a worker uploads it and back-fills voice_sample_url. Every job is a copy of the
+    audio plus a JSON manifest in the spool directory, so pending uploads survive
+    restarts. The owning process holds an flock on the manifest: other Gunicorn
+    workers skip locked jobs and adopt them once their owner has died. A job
+    waiting out a retry backoff is unlocked (no descriptor kept open) and marked
+    with retry_at, so nobody adopts it early; its timer claims it again.
+    """
+
+    def __init__(self, spool_dir=UPLOAD_SPOOL_DIR, workers=UPLOAD_WORKERS, max_attempts=UPLOAD_MAX_ATTEMPTS,
+                 retry_base=UPLOAD_RETRY_BASE, retry_max=UPLOAD_RETRY_MAX, rescan_interval=UPLOAD_RESCAN_INTERVAL):
+        self.spool_dir = spool_dir
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.rescan_interval = rescan_interval
+        self.app = None
+        self.uploader = None
+        self.backend = None
+        self.uploaded = 0
+        self.retried = 0
+        self.failed = 0
+        self.waiting = 0  # jobs released until their retry timer fires
+        self._queue = queue.Queue()
+        self._claims = {}  # job_id -> {'handle': locked manifest file, 'job': manifest dict}
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app, uploader=None):
+        """Bind to the Flask app, pick the uploader and start the worker threads"""
+        self.app = app
+        if uploader is not None:
+            self.uploader, self.backend = uploader, type(uploader).__name__
+        elif UPLOAD_BACKEND == 'local':
+            self.uploader, self.backend = LocalUploader(), 'local'
+        else:
+            self.uploader, self.backend = cloudinary_service, 'cloudinary'
+
+        os.makedirs(os.path.join(self.spool_dir, 'failed'), exist_ok=True)
+        self._start()
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Forked (preloaded Gunicorn): the parent's threads, queue and claims stay with the parent
+                self._queue = queue.Queue()
+                self._claims = {}
+                self.waiting = 0
+            self._pid = os.getpid()
+            self._threads = []
+            for i in range(self.workers):
+                self._threads.append(threading.Thread(target=self._work, name=f"upload-worker-{i}", daemon=True))
+            self._threads.append(threading.Thread(target=self._sweep, name="upload-sweeper", daemon=True))
+            for thread in self._threads:
+                thread.start()
+        print(f"📤 Upload queue started ({self.backend}, {self.workers} workers, spool: {self.spool_dir})")
+
+    def enqueue(self, source, kind, record_id, student_id, teacher_id, purpose):
+        """Spool a sample (file path or AudioUpload) for background upload; returns the job id or None"""
+        if self.app is None or not self.uploader.is_available():
+            print("🏠 Voice sample upload skipped - no upload backend available")
+            return None
+        if self._pid != os.getpid():
+            self._start()
+
+        job_id = uuid.uuid4().hex
+        try:
+            if isinstance(source, AudioUpload):
+                # The request's buffer is written once, straight into the spool
+                audio_file = f"{job_id}.{source.extension}"
+                with open(os.path.join(self.spool_dir, audio_file), 'wb') as f:
+                    f.write(source.data)
+            else:
+                audio_file = job_id + (os.path.splitext(source)[1] or '.wav')
+                shutil.copyfile(source, os.path.join(self.spool_dir, audio_file))
+            job = {
+                'kind': kind,
+                'record_id': record_id,
+                'student_id': student_id,
+                'teacher_id': teacher_id,
+                'purpose': purpose,
+                'audio_file': audio_file,
+                'attempts': 0,
+                'url': None,
+                'created_at': datetime.now().isoformat()
+            }
+            self._create_manifest(job_id, job)
+        except Exception as e:
+            print(f"❌ Could not spool voice sample for upload: {e}")
+            for path in glob.glob(os.path.join(self.spool_dir, job_id + '*')):
+                os.remove(path)
+            return None
+
+        self._queue.put(job_id)
+        return job_id
+
+    def _manifest_path(self, job_id):
+        return os.path.join(self.spool_dir, job_id + '.json')
+
+    def _create_manifest(self, job_id, job):
+        """Write and lock the manifest under a temporary name, then publish it atomically"""
+        temp_path = self._manifest_path(job_id) + '.tmp'
+        handle = open(temp_path, 'w+')
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        claim = {'handle': handle, 'job': job}
+        self._write_manifest(claim)
+        os.rename(temp_path, self._manifest_path(job_id))
+        with self._lock:
+            self._claims[job_id] = claim
+
+    def _write_manifest(self, claim):
+        """Rewrite the manifest in place so the lock stays on the same file"""
+        handle = claim['handle']
+        handle.seek(0)
+        handle.truncate()
+        json.dump(claim['job'], handle)
+        handle.flush()
+        os.fsync(handle.fileno())
+
+    def _claim(self, job_id, honour_backoff=True):
+        """Lock a spooled job nobody else owns; returns False if it is taken, gone or still backing off"""
+        try:
+            handle = open(self._manifest_path(job_id), 'r+')
+        except FileNotFoundError:
+            return False
+
+        if fcntl:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                handle.close()  # Owned by another live worker
+                return False
+
+        # The owner may have finished and deleted the job while we waited for the lock
+        if os.fstat(handle.fileno()).st_nlink == 0:
+            handle.close()
+            return False
+
+        try:
+            job = json.load(handle)
+        except ValueError:
+            print(f"⚠️ Unreadable upload manifest {job_id} - moved to failed/")
+            self._move_to_failed(job_id)
+            handle.close()
+            return False
+
+        if honour_backoff and job.get('retry_at', 0) > time.time():
+            handle.close()  # Its retry timer will claim it
+            return False
+
+        with self._lock:
+            self._claims[job_id] = {'handle': handle, 'job': job}
+        return True
+
+    def _release(self, job_id):
+        with self._lock:
+            claim = self._claims.pop(job_id, None)
+        if claim:
+            claim['handle'].close()
+
+    def _move_to_failed(self, job_id):
+        for path in glob.glob(os.path.join(self.spool_dir, job_id + '*')):
+            os.replace(path, os.path.join(self.spool_dir, 'failed', os.path.basename(path)))
+
+    def recover(self):
+        """Adopt spooled jobs left behind by a restart or a dead worker"""
+        if not self.uploader.is_available():
+            return 0
+
+        recovered = 0
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, '*.json'))):
+            job_id = os.path.basename(path)[:-len('.json')]
+            with self._lock:
+                if job_id in self._claims:
+                    continue
+            if self._claim(job_id):
+                self._queue.put(job_id)
+                recovered += 1
+
+        if recovered:
+            print(f"📦 Recovered {recovered} pending voice sample uploads")
+        return recovered
+
+    def _sweep(self):
+        while True:
+            try:
+                self.recover()
+            except Exception as e:
+                print(f"❌ Upload spool scan error: {e}")
+            time.sleep(self.rescan_interval)
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._process(job_id)
+            except Exception as e:
+                print(f"❌ Upload worker error: {e}")
+                self._retry_or_fail(job_id, str(e))
+
+    def _process(self, job_id):
+        with self._lock:
+            claim = self._claims.get(job_id)
+        if claim is None:
+            return
+        job = claim['job']
+
+        # A job whose upload succeeded before a failed back-fill only needs the back-fill
+        if not job.get('url'):
+            result = self.uploader.upload_voice_sample(
+                os.path.join(self.spool_dir, job['audio_file']),
+                job['student_id'],
+                job['teacher_id'],
+                job['purpose']
+            )
+            if not result['success']:
+                self._retry_or_fail(job_id, result.get('error', 'Unknown error'), result.get('retryable', True))
+                return
+            job['url'] = result['url']
+            self._write_manifest(claim)
+
+        self._backfill(job)
+
+        os.remove(os.path.join(self.spool_dir, job['audio_file']))
+        os.remove(self._manifest_path(job_id))
+        self._release(job_id)
+        with self._lock:
+            self.uploaded += 1
+        print(f"✅ Voice sample uploaded for {job['student_id']} ({job['purpose']})")
+
+    def _backfill(self, job):
+        """Store the uploaded URL on the row the job was queued for"""
+        with self.app.app_context():
+            record = db.session.get(RECORD_MODELS[job['kind']], job['record_id'])
+            if record is None:
+                print(f"⚠️ {job['kind']} record {job['record_id']} no longer exists - upload URL discarded")
+                return
+            record.voice_sample_url = job['url']
+            db.session.commit()
+
+    def _retry_or_fail(self, job_id, error, retryable=True):
+        """Reschedule a failed job with exponential backoff, or park it in failed/"""
+        with self._lock:
+            claim = self._claims.get(job_id)
+        if claim is None:
+            return
+        job = claim['job']
+        job['attempts'] += 1
+        job['last_error'] = error
+
+        if retryable and job['attempts'] < self.max_attempts:
+            delay = min(self.retry_max, self.retry_base * 2 ** (job['attempts'] - 1))
+            job['retry_at'] = time.time() + delay
+            self._write_manifest(claim)
+            # Unlock while waiting, so a backlog of failing uploads does not hold a descriptor each
+            self._release(job_id)
+            with self._lock:
+                self.retried += 1
+                self.waiting += 1
+            print(f"🔁 Upload for {job['student_id']} failed ({error}) - retry {job['attempts']} in {delay:.0f}s")
+            timer = threading.Timer(delay, self._reclaim, (job_id,))
+            timer.daemon = True
+            timer.start()
+            return
+
+        self._write_manifest(claim)
+        self._move_to_failed(job_id)
+        self._release(job_id)
+        with self._lock:
+            self.failed += 1
+        print(f"❌ Giving up on upload for {job['student_id']} after {job['attempts']} attempts: {error}")
+
+    def _reclaim(self, job_id):
+        """Claim a job again once its backoff has passed (taken over or finished elsewhere otherwise)"""
+        with self._lock:
+            self.waiting -= 1
+        try:
+            if self._claim(job_id, honour_backoff=False):
+                self._queue.put(job_id)
+        except Exception as e:
+            print(f"❌ Could not reclaim upload {job_id}: {e}")
+
+    def status(self):
+        """Queue figures for the system status API"""
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'running': any(thread.is_alive() for thread in self._threads) and self._pid == os.getpid(),
+                'queued': self._queue.qsize(),
+                'spooled': len(self._claims),
+                'waiting': self.waiting,
+                'uploaded': self.uploaded,
+                'retried': self.retried,
+                'failed': self.failed
+            }
+
+
+# Global instance
+upload_queue = UploadQueue()
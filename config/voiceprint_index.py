@@ -0,0 +1,105 @@
+import threading
+import numpy as np
+from .models import db, Student
+from .scoring import TemplateSet, score_templates
+
+
+class TeacherVoiceprints:
+    """Prepared float32 template matrix of one teacher's active, enrolled voiceprints"""
+
+    def __init__(self, students, signature):
+        self.signature = signature
+        self.student_ids = []
+        self.student_names = []
+        self.student_pks = []
+
+        vectors = []
+        dimension = None
+        for student in students:
+            features = student.get_voice_features()
+            if features is None:
+                continue
+            if dimension is None:
+                dimension = len(features)
+            if len(features) != dimension:
+                print(f"⚠️ Skipping voiceprint for {student.student_id}: dimension {len(features)} != {dimension}")
+                continue
+            vectors.append(features)
+            self.student_ids.append(student.student_id)
+            self.student_names.append(student.student_name)
+            self.student_pks.append(student.id)
+
+        self.templates = TemplateSet(np.array(vectors, dtype=np.float32).reshape(len(vectors), dimension or 0))
+
+    def __len__(self):
+        return len(self.templates)
+
+    @property
+    def dimension(self):
+        return self.templates.dimension
+
+    def score(self, features):
+        """Combined similarity of features against every voiceprint"""
+        return score_templates(features, self.templates)[2]
+
+
+class VoiceprintIndex:
+    """Per-teacher voiceprint matrices kept in memory between requests
+
+    Entries are dropped on enrollment in this process. Other Gunicorn workers
+    notice a change through a cheap (count, max id) signature query, so they
+    never score against a stale class list.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _signature(self, teacher_id):
+        return tuple(db.session.query(
+            db.func.count(Student.id), db.func.max(Student.id)
+        ).filter(
+            Student.teacher_id == teacher_id,
+            Student.is_active == True
+        ).one())
+
+    def get(self, teacher_id):
+        """Voiceprint matrix for a teacher, rebuilt only when enrollment changed"""
+        signature = self._signature(teacher_id)
+        with self._lock:
+            entry = self._entries.get(teacher_id)
+        if entry is not None and entry.signature == signature:
+            return entry
+
+        students = Student.query.filter_by(teacher_id=teacher_id, is_active=True).all()
+        entry = TeacherVoiceprints(students, signature)
+        with self._lock:
+            self._entries[teacher_id] = entry
+        print(f"🗂️ Voiceprint index built for teacher {teacher_id}: {len(entry)} students")
+        return entry
+
+    def invalidate(self, teacher_id):
+        with self._lock:
+            self._entries.pop(teacher_id, None)
+
+    def identify(self, teacher_id, features, top_k=3):
+        """Rank a teacher's enrolled students by similarity to features (best first)"""
+        entry = self.get(teacher_id)
+        if not len(entry) or len(features) != entry.dimension:
+            return []
+
+        scores = entry.score(features)
+        order = np.argsort(scores)[::-1][:top_k]
+        return [
+            {
+                'student_pk': entry.student_pks[i],
+                'student_id': entry.student_ids[i],
+                'name': entry.student_names[i],
+                'score': float(scores[i])
+            }
+            for i in order
+        ]
+
+
+# Global instance
+voiceprint_index = VoiceprintIndex()
@@ -2,20 +2,50 @@ from flask import current_app
 from flask_login import current_user
 
 import json 
-import hashlib
+import base64
 import os
 from .constants import *
 import librosa
-from pydub import AudioSegment
 import soundfile as sf
-from sklearn.metrics.pairwise import cosine_similarity
 from werkzeug.utils import secure_filename
 import pickle
 import datetime
+import time
 import numpy as np
 from .security import SecurityManager
 from .models import db, Student, AttendanceRecord, SecurityLog
 from .cloudinary_service import cloudinary_service
+from .upload_queue import upload_queue
+from .audio_processing import DecodedAudio, validate_audio
+from .audio_stream import StreamedAudio
+from .feature_extraction import analyse_voice_sample
+from .extraction_pool import extraction_pool, ExtractionPoolBusy
+from .feature_cache import feature_cache
+from .audit_log import audit_log
+from .dashboard_stats import dashboard_stats
+from .voiceprint_index import voiceprint_index
+from .scoring import score_pair
+
+
+def day_bounds(day):
+    """[start, end) datetimes of a calendar day, so timestamp filters can use the indexes"""
+    start = datetime.datetime.combine(day, datetime.time.min)
+    return start, start + datetime.timedelta(days=1)
+
+
+def encode_cursor(timestamp, row_id):
+    """Opaque page cursor for the (timestamp, id) position of the last row returned"""
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{row_id}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(timestamp, id) from encode_cursor(); raises ValueError for anything else"""
+    try:
+        text = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, row_id = text.split('|')
+        return datetime.datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
 
 
 
@@ -129,155 +159,61 @@ class EnhancedVoiceRecognitionSystem:
             print(f"📂 No legacy attendance records found: {e}")
         return []
     
-    def validate_audio_file(self, audio_file_path):
+    def validate_audio_file(self, audio_file):
         """Validate audio file quality and properties"""
-        try:
-            y, sr = librosa.load(audio_file_path, sr=None)
-            duration = len(y) / sr
-            
-            # Check duration
-            if duration < MIN_AUDIO_DURATION:
-                return False, f"Audio too short. Minimum {MIN_AUDIO_DURATION} seconds required."
-            
-            if duration > MAX_AUDIO_DURATION:
-                return False, f"Audio too long. Maximum {MAX_AUDIO_DURATION} seconds allowed."
-            
-            # Check for silence (basic voice activity detection)
-            energy = np.sqrt(np.mean(y**2))
-            if energy < 0.001:  # Threshold for silence detection
-                return False, "Audio appears to be silent or too quiet."
-            
-            # Check for minimum frequency content (basic voice detection)
-            fft = np.fft.fft(y)
-            freq_energy = np.abs(fft)
-            
-            # Look for voice-like frequency content (roughly 85Hz - 8kHz)
-            voice_range_start = int(85 * len(fft) / sr)
-            voice_range_end = int(8000 * len(fft) / sr)
-            voice_energy = np.sum(freq_energy[voice_range_start:voice_range_end])
-            total_energy = np.sum(freq_energy)
-            
-            if voice_energy / total_energy < 0.1:  # At least 10% energy in voice range
-                return False, "Audio doesn't appear to contain voice content."
-            
-            print(f"✅ Audio validation passed: Duration {duration:.2f}s, Energy: {energy:.4f}")
-            return True, "Audio validation successful"
-            
-        except Exception as e:
-            return False, f"Error processing audio file: {str(e)}"
-            voice_freq_range = freq_energy[int(len(freq_energy) * 85/sr):int(len(freq_energy) * 3400/sr)]
-            
-            if np.mean(voice_freq_range) < np.mean(freq_energy) * 0.1:
-                return False, "Audio doesn't appear to contain human voice."
-            
-            return True, "Audio validation passed"
-            
-        except Exception as e:
-            return False, f"Audio validation error: {str(e)}"
+        return validate_audio(audio_file)
     
-    def extract_enhanced_voice_features(self, audio_file):
-        """Extract enhanced voice features with additional security measures"""
-        try:
-            print(f"🎤 Starting enhanced voice feature extraction from: {audio_file}")
-            
-            # Validate audio first
-            valid, validation_message = self.validate_audio_file(audio_file)
-            if not valid:
-                print(f"❌ Audio validation failed: {validation_message}")
-                return None, validation_message
-            
-            y, sr = librosa.load(audio_file, sr=22050)  # Standardize sample rate
-            print(f"📊 Audio loaded - Duration: {len(y)/sr:.2f}s, Sample Rate: {sr}Hz")
-            
-            # Extract multiple types of features for better discrimination
-            features = []
-            
-            # 1. MFCC features (spectral characteristics)
-            mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-            for i in range(mfccs.shape[0]):
-                features.extend([
-                    np.mean(mfccs[i]),
-                    np.std(mfccs[i]),
-                    np.max(mfccs[i]),
-                    np.min(mfccs[i])
-                ])
-            
-            # 2. Pitch/F0 features (fundamental frequency)
-            pitches, magnitudes = librosa.piptrack(y=y, sr=sr)
-            pitch_values = []
-            for t in range(pitches.shape[1]):
-                index = magnitudes[:, t].argmax()
-                pitch = pitches[index, t]
-                if pitch > 0:
-                    pitch_values.append(pitch)
-            
-            if pitch_values:
-                features.extend([
-                    np.mean(pitch_values),
-                    np.std(pitch_values),
-                    np.max(pitch_values),
-                    np.min(pitch_values)
-                ])
+    def analyse_voice_sample(self, audio_file):
+        """Validate a clip and extract its features, in the extraction pool when it is enabled"""
+        # Streamed recordings were analysed chunk by chunk while they were uploaded
+        if isinstance(audio_file, StreamedAudio):
+            return audio_file.analysis
+        
+        # A re-submitted clip skips decoding and extraction
+        key = feature_cache.key_for(audio_file)
+        analysis = feature_cache.get(key)
+        if analysis is not None:
+            print("♻️ Reusing features of an identical earlier upload")
+            return analysis
+        
+        # Already decoded clips are processed in place rather than shipped to a worker
+        if extraction_pool.enabled and not isinstance(audio_file, DecodedAudio):
+            analysis = extraction_pool.analyse(audio_file)
+        else:
+            analysis = analyse_voice_sample(audio_file)
+        feature_cache.put(key, analysis)
+        return analysis
+    
+    def analyse_voice_samples(self, audio_files):
+        """Validate and extract several clips, in parallel across the pool workers when enabled
+        
+        Cached clips, and repeats of the same clip within the batch, are only analysed once.
+        """
+        keys = [feature_cache.key_for(audio_file) for audio_file in audio_files]
+        analyses = [feature_cache.get(key) for key in keys]
+        
+        pending = {}  # key (or position for uncacheable clips) -> positions needing that analysis
+        for index, (key, analysis) in enumerate(zip(keys, analyses)):
+            if analysis is None:
+                pending.setdefault(key if key is not None else index, []).append(index)
+        
+        if pending:
+            to_analyse = [audio_files[positions[0]] for positions in pending.values()]
+            if extraction_pool.enabled:
+                results = extraction_pool.analyse_many(to_analyse)
             else:
-                features.extend([0, 0, 0, 0])
-            
-            # 3. Spectral features
-            spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-            spectral_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)[0]
-            
-            features.extend([
-                np.mean(spectral_centroids),
-                np.std(spectral_centroids),
-                np.mean(spectral_rolloff),
-                np.std(spectral_rolloff)
-            ])
-            
-            # 4. Formant-like features (approximation)
-            stft = librosa.stft(y)
-            magnitude = np.abs(stft)
-            formant_features = []
-            for frame in range(min(10, magnitude.shape[1])):  # Sample first 10 frames
-                frame_mag = magnitude[:, frame]
-                peaks = np.where(frame_mag > np.mean(frame_mag) + np.std(frame_mag))[0]
-                if len(peaks) >= 2:
-                    formant_features.extend([peaks[0], peaks[1]])
-                else:
-                    formant_features.extend([0, 0])
-            
-            # Pad or truncate to fixed size
-            while len(formant_features) < 20:
-                formant_features.append(0)
-            formant_features = formant_features[:20]
-            features.extend(formant_features)
-            
-            features_array = np.array(features)
-            
-            # Normalize features
-            if np.std(features_array) != 0:
-                features_array = (features_array - np.mean(features_array)) / np.std(features_array)
-            
-            print(f"✅ Enhanced feature extraction successful - Feature vector size: {len(features_array)}")
-            return features_array, "Feature extraction successful"
+                results = [analyse_voice_sample(audio_file) for audio_file in to_analyse]
             
-        except Exception as e:
-            error_msg = f"Error extracting enhanced features: {e}"
-            print(f"❌ {error_msg}")
-            return None, error_msg
+            for positions, analysis in zip(pending.values(), results):
+                feature_cache.put(keys[positions[0]], analysis)
+                for index in positions:
+                    analyses[index] = analysis
+        return analyses
     
-    def convert_m4a_to_wav(self, input_m4a_path):
-        try:
-            print(f"🔄 Converting M4A to WAV: {input_m4a_path}")
-            
-            audio = AudioSegment.from_file(input_m4a_path, format="m4a")
-            output_wav_path = input_m4a_path.rsplit('.', 1)[0] + '.wav'
-            audio.export(output_wav_path, format="wav")
-            
-            print(f"✅ Conversion successful: {output_wav_path}")
-            return output_wav_path
-            
-        except Exception as e:
-            print(f"❌ Error converting M4A to WAV: {e}")
-            return None
+    def extract_enhanced_voice_features(self, audio_file):
+        """Extract enhanced voice features with additional security measures"""
+        analysis = self.analyse_voice_sample(audio_file)
+        return analysis['features'], analysis['message']
     
     def enroll_student(self, student_id, student_name, audio_file_path):
         """Enhanced student enrollment with database and Cloudinary"""
@@ -297,13 +233,12 @@ class EnhancedVoiceRecognitionSystem:
             if existing_student:
                 return False, f"Student {student_id} is already enrolled"
             
-            # Validate audio file
-            is_valid, validation_message = self.validate_audio_file(audio_file_path)
-            if not is_valid:
-                return False, f"Audio validation failed: {validation_message}"
+            # Validate and extract features from a single decode of the clip
+            analysis = self.analyse_voice_sample(audio_file_path)
+            if not analysis['valid']:
+                return False, f"Audio validation failed: {analysis['message']}"
             
-            # Extract voice features  
-            features, message = self.extract_enhanced_voice_features(audio_file_path)
+            features, message = analysis['features'], analysis['message']
             if features is None:
                 self.security_manager.log_security_event(
                     "ENROLLMENT_FEATURE_EXTRACTION_FAILED", 
@@ -313,35 +248,22 @@ class EnhancedVoiceRecognitionSystem:
                 )
                 return False, f"Enrollment failed: {message}"
             
-            # Upload to Cloudinary (with fallback to local storage)
-            upload_result = cloudinary_service.upload_voice_sample(
-                audio_file_path, 
-                student_id, 
-                current_user.id, 
-                'enrollment'
-            )
-            
-            voice_sample_url = None
-            if upload_result['success']:
-                voice_sample_url = upload_result['url']
-                print(f"✅ Voice sample uploaded to Cloudinary")
-            else:
-                print(f"⚠️ Cloudinary upload failed: {upload_result.get('error', 'Unknown error')}")
-                print(f"📁 Voice features will be stored without cloud URL")
-                # We can still proceed without the cloud URL since we have the features
-            
-            # Create student record
+            # Create student record (voice_sample_url is back-filled by the upload queue)
             student = Student(
                 student_id=student_id,
                 student_name=student_name,
-                teacher_id=current_user.id,
-                voice_sample_url=voice_sample_url  # Will be None if Cloudinary failed
+                teacher_id=current_user.id
             )
             student.set_voice_features(features)
             
             # Save to database
             db.session.add(student)
             db.session.commit()
+            voiceprint_index.invalidate(current_user.id)
+            dashboard_stats.student_enrolled(current_user.id)
+            
+            # Upload the sample in the background - the features are already stored
+            upload_queue.enqueue(audio_file_path, 'student', student.id, student_id, current_user.id, 'enrollment')
             
             # Log successful enrollment
             self.security_manager.log_security_event(
@@ -354,6 +276,8 @@ class EnhancedVoiceRecognitionSystem:
             print(f"✅ Student '{student_name}' enrolled successfully!")
             return True, "Student enrolled successfully"
             
+        except ExtractionPoolBusy:
+            raise
         except Exception as e:
             db.session.rollback()
             print(f"❌ Enrollment error: {e}")
@@ -381,11 +305,8 @@ class EnhancedVoiceRecognitionSystem:
             )
             return False, "Account temporarily locked due to suspicious activity", 0.0
         
-        # Convert audio if needed
-        audio = self.convert_m4a_to_wav(audio_file) if audio_file.endswith('.m4a') else audio_file
-        
-        # Extract features from test audio
-        test_features, message = self.extract_enhanced_voice_features(audio)
+        # Extract features from test audio (M4A is decoded by the pooled ffmpeg decoder)
+        test_features, message = self.extract_enhanced_voice_features(audio_file)
         if test_features is None:
             self.security_manager.record_failed_attempt(student_id)
             self.security_manager.log_security_event(
@@ -408,15 +329,8 @@ class EnhancedVoiceRecognitionSystem:
             )
             return False, "Feature extraction error - please try again", 0.0
         
-        # Calculate similarity using multiple methods
-        cosine_sim = cosine_similarity([test_features], [stored_features])[0][0]
-        
-        # Additional similarity measures for enhanced security
-        euclidean_dist = np.linalg.norm(test_features - stored_features)
-        normalized_euclidean = 1 / (1 + euclidean_dist)  # Convert distance to similarity
-        
-        # Weighted combination of similarities
-        combined_similarity = 0.7 * cosine_sim + 0.3 * normalized_euclidean
+        # Cosine, Euclidean and weighted combined similarity in one pass
+        cosine_sim, normalized_euclidean, combined_similarity = score_pair(test_features, stored_features)
         
         print(f"🎯 Voice similarity analysis:")
         print(f"   Cosine similarity: {cosine_sim:.4f}")
@@ -452,12 +366,17 @@ class EnhancedVoiceRecognitionSystem:
             print(f"❌ Voice verification FAILED - Similarity too low")
             return False, f"Voice verification failed (confidence: {combined_similarity:.2f})", float(combined_similarity)
     
-    def mark_attendance(self, student_id, audio_file_path):
-        """Enhanced attendance marking with database and Cloudinary"""
+    def mark_attendance(self, student_id, audio_file_path, metadata=None):
+        """Enhanced attendance marking with database and Cloudinary
+        
+        metadata (see request_metadata in routes) is stored on the record in the
+        same insert. Returns (success, message, record); record is the created
+        AttendanceRecord, or None when nothing was marked.
+        """
         try:
             # Check if current_user is available and authenticated
             if not (current_user and hasattr(current_user, 'is_authenticated') and current_user.is_authenticated):
-                return False, "Authentication required for attendance"
+                return False, "Authentication required for attendance", None
                 
             print(f"📝 Starting attendance marking for Student ID: {student_id}")
             
@@ -468,90 +387,339 @@ class EnhancedVoiceRecognitionSystem:
             ).first()
             
             if not student:
-                return False, f"Student {student_id} not found"
+                return False, f"Student {student_id} not found", None
             
-            # Check if already marked today
-            today = datetime.datetime.now().date()
-            existing_record = AttendanceRecord.query.filter(
-                AttendanceRecord.student_id == student.id,
-                db.func.date(AttendanceRecord.timestamp) == today
-            ).first()
+            allowed, message, rate_limit_key = self._check_attendance_allowed(student)
+            if not allowed:
+                return False, message, None
+            
+            # Verify voice
+            verified, message, similarity = self.verify_student_voice_db(student, audio_file_path)
+            
+            if not verified:
+                self.security_manager.apply_rate_limit(rate_limit_key)
+                return False, message, None
+            
+            message = f"Attendance marked successfully for {student.student_name}"
+            record = self._save_attendance(student, similarity, audio_file_path, metadata)
+            return True, message, record
+            
+        except ExtractionPoolBusy:
+            raise
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Attendance error: {e}")
+            return False, f"Attendance marking failed: {str(e)}", None
+    
+    def identify_and_mark_attendance(self, audio_file_path, threshold=MIN_VOICE_THRESHOLD, metadata=None):
+        """Identify which enrolled student is speaking (1:N) and mark their attendance
+        
+        Returns (success, message, candidates, record) where candidates are the
+        best scoring students, best first, and record is the created
+        AttendanceRecord (None when nothing was marked).
+        """
+        try:
+            if not (current_user and hasattr(current_user, 'is_authenticated') and current_user.is_authenticated):
+                return False, "Authentication required for attendance", [], None
+            
+            print(f"📝 Starting voice identification for teacher {current_user.id}")
+            
+            test_features, message = self.extract_enhanced_voice_features(audio_file_path)
+            if test_features is None:
+                return False, f"Identification failed: {message}", [], None
+            
+            # Score the sample against the whole class in one matrix-vector product
+            candidates = voiceprint_index.identify(current_user.id, test_features)
+            if not candidates:
+                return False, "No enrolled students to identify against", [], None
+            
+            best = candidates[0]
+            runner_up_score = candidates[1]['score'] if len(candidates) > 1 else 0.0
+            print(f"🎯 Best match: {best['name']} ({best['score']:.4f}), runner-up: {runner_up_score:.4f}")
+            
+            if best['score'] < threshold:
+                self.security_manager.log_security_event(
+                    "FAILED_VOICE_IDENTIFICATION", 
+                    None, 
+                    f"No enrolled voice matched (best similarity: {best['score']:.4f})",
+                    teacher_id=current_user.id
+                )
+                return False, f"Voice not recognised (confidence: {best['score']:.2f})", candidates, None
+            
+            if best['score'] - runner_up_score < IDENTIFICATION_MIN_MARGIN:
+                self.security_manager.log_security_event(
+                    "AMBIGUOUS_VOICE_IDENTIFICATION", 
+                    best['student_id'], 
+                    f"Voice matched several students ({best['score']:.4f} vs {runner_up_score:.4f})",
+                    teacher_id=current_user.id
+                )
+                return False, "Voice matched more than one student - please select your name", candidates, None
+            
+            student = Student.query.get(best['student_pk'])
+            
+            allowed, message, rate_limit_key = self._check_attendance_allowed(student)
+            if not allowed:
+                return False, message, candidates, None
+            
+            self.security_manager.log_security_event(
+                "SUCCESSFUL_VOICE_IDENTIFICATION", 
+                student.student_id, 
+                f"Voice identified as {student.student_name} (similarity: {best['score']:.4f})",
+                teacher_id=current_user.id
+            )
+            
+            message = f"Attendance marked successfully for {student.student_name}"
+            record = self._save_attendance(student, best['score'], audio_file_path, metadata)
+            return True, message, candidates, record
+            
+        except ExtractionPoolBusy:
+            raise
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Identification error: {e}")
+            return False, f"Attendance marking failed: {str(e)}", [], None
+    
+    def _check_attendance_allowed(self, student):
+        """Duplicate and rate-limit checks before a student's voice is verified
+        
+        Returns (allowed, message, rate_limit_key).
+        """
+        rate_limit_key = f"attendance_{student.student_id}_{current_user.id}"
+        
+        # Check if already marked today
+        day_start, day_end = day_bounds(datetime.datetime.now().date())
+        existing_record = AttendanceRecord.query.filter(
+            AttendanceRecord.student_id == student.id,
+            AttendanceRecord.timestamp >= day_start,
+            AttendanceRecord.timestamp < day_end
+        ).first()
+        
+        if existing_record:
+            self.security_manager.log_security_event(
+                "DUPLICATE_ATTENDANCE_ATTEMPT", 
+                student.student_id, 
+                f"Attempted to mark attendance twice for {student.student_name}",
+                teacher_id=current_user.id
+            )
+            return False, "Attendance already marked for today", rate_limit_key
+        
+        # Rate limiting check
+        if not self.security_manager.check_rate_limit(rate_limit_key):
+            self.security_manager.log_security_event(
+                "RATE_LIMIT_EXCEEDED", 
+                student.student_id, 
+                "Rate limit exceeded for attendance marking",
+                teacher_id=current_user.id
+            )
+            return False, "Too many attendance attempts. Please wait before trying again.", rate_limit_key
+        
+        return True, None, rate_limit_key
+    
+    @staticmethod
+    def _request_columns(metadata):
+        """AttendanceRecord columns taken from the request metadata"""
+        metadata = metadata or {}
+        started_at = metadata.get('started_at')
+        return {
+            'ip_address': metadata.get('ip_address'),
+            'device': metadata.get('device'),
+            'processing_ms': round((time.perf_counter() - started_at) * 1000) if started_at else None
+        }
+    
+    @staticmethod
+    def _insert_records(records):
+        """Insert attendance records in one transaction
+        
+        The records are detached before the commit, so they keep their values
+        (id, timestamp) instead of being reloaded when read afterwards.
+        """
+        db.session.add_all(records)
+        db.session.flush()
+        for record in records:
+            db.session.expunge(record)
+        db.session.commit()
+    
+    def _save_attendance(self, student, similarity, audio_file_path, metadata=None):
+        """Persist the attendance record, request metadata included, and queue the verified sample for upload"""
+        # Read before the commit expires them
+        teacher_id = current_user.id
+        student_id, student_name = student.student_id, student.student_name
+        
+        # Create attendance record (voice_sample_url is back-filled by the upload queue)
+        attendance_record = AttendanceRecord(
+            student_id=student.id,
+            teacher_id=teacher_id,
+            confidence_score=float(similarity),  # Convert numpy float64 to Python float
+            **self._request_columns(metadata)
+        )
+        
+        self._insert_records([attendance_record])
+        dashboard_stats.attendance_marked(teacher_id)
+        
+        upload_queue.enqueue(audio_file_path, 'attendance', attendance_record.id, student_id,
+                             teacher_id, 'attendance')
+        
+        # Log successful attendance
+        self.security_manager.log_security_event(
+            "SUCCESSFUL_ATTENDANCE", 
+            student_id, 
+            f"Attendance marked for {student_name} (confidence: {similarity:.4f})",
+            teacher_id=teacher_id
+        )
+        
+        print(f"✅ Attendance marked successfully for {student_name}")
+        return attendance_record
+    
+    def mark_attendance_batch(self, entries, metadata=None):
+        """Mark attendance for many (student_id, audio_file_path) pairs in one pass
+        
+        Students are loaded in a single query, every clip is analysed in parallel and
+        all attendance records are inserted in one transaction. Returns a list of
+        per-entry result dicts in the order the entries were given.
+        """
+        if not (current_user and hasattr(current_user, 'is_authenticated') and current_user.is_authenticated):
+            return [{'student_id': student_id, 'success': False, 'message': "Authentication required for attendance"}
+                    for student_id, _ in entries]
+        
+        print(f"📝 Starting batch attendance marking for {len(entries)} students")
+        results = [None] * len(entries)
+        
+        # Bulk-load students and today's existing records
+        requested_ids = {student_id for student_id, _ in entries}
+        students = {
+            student.student_id: student
+            for student in Student.query.filter(
+                Student.teacher_id == current_user.id,
+                Student.student_id.in_(requested_ids)
+            ).all()
+        }
+        
+        day_start, day_end = day_bounds(datetime.datetime.now().date())
+        already_marked = {
+            row.student_id
+            for row in AttendanceRecord.query.with_entities(AttendanceRecord.student_id).filter(
+                AttendanceRecord.student_id.in_([student.id for student in students.values()]),
+                AttendanceRecord.timestamp >= day_start,
+                AttendanceRecord.timestamp < day_end
+            ).all()
+        }
+        
+        # Pre-checks that need no audio processing
+        pending = []  # (index, student, audio_file_path, rate_limit_key)
+        seen = set()
+        for index, (student_id, audio_file_path) in enumerate(entries):
+            student = students.get(student_id)
+            rate_limit_key = f"attendance_{student_id}_{current_user.id}"
             
-            if existing_record:
+            if student_id in seen:
+                message = "Duplicate entry in batch"
+            elif not student:
+                message = f"Student {student_id} not found"
+            elif student.id in already_marked:
                 self.security_manager.log_security_event(
                     "DUPLICATE_ATTENDANCE_ATTEMPT", 
                     student_id, 
                     f"Attempted to mark attendance twice for {student.student_name}",
                     teacher_id=current_user.id
                 )
-                return False, "Attendance already marked for today"
-            
-            # Rate limiting check
-            rate_limit_key = f"attendance_{student_id}_{current_user.id}"
-            if not self.security_manager.check_rate_limit(rate_limit_key):
+                message = "Attendance already marked for today"
+            elif not self.security_manager.check_rate_limit(rate_limit_key):
                 self.security_manager.log_security_event(
                     "RATE_LIMIT_EXCEEDED", 
                     student_id, 
                     "Rate limit exceeded for attendance marking",
                     teacher_id=current_user.id
                 )
-                return False, "Too many attendance attempts. Please wait before trying again."
-            
-            # Verify voice
-            verified, message, similarity = self.verify_student_voice_db(student, audio_file_path)
+                message = "Too many attendance attempts. Please wait before trying again."
+            else:
+                message = None
+                pending.append((index, student, audio_file_path, rate_limit_key))
             
+            seen.add(student_id)
+            if message:
+                results[index] = {'student_id': student_id, 'success': False, 'message': message}
+        
+        # Analyse every remaining clip in parallel
+        analyses = self.analyse_voice_samples([audio_file_path for _, _, audio_file_path, _ in pending])
+        
+        verified_entries = []
+        for (index, student, audio_file_path, rate_limit_key), analysis in zip(pending, analyses):
+            verified, message, similarity = self.verify_voice_features(
+                student, analysis['features'], analysis['message']
+            )
             if not verified:
                 self.security_manager.apply_rate_limit(rate_limit_key)
-                return False, message
-            
-            # Upload attendance audio to Cloudinary
-            upload_result = cloudinary_service.upload_voice_sample(
-                audio_file_path, 
-                student_id, 
-                current_user.id, 
-                'attendance'
-            )
+                results[index] = {'student_id': student.student_id, 'success': False, 'message': message,
+                                  'confidence': similarity}
+                continue
             
-            # Create attendance record
-            attendance_record = AttendanceRecord(
+            record = AttendanceRecord(
                 student_id=student.id,
                 teacher_id=current_user.id,
-                confidence_score=float(similarity),  # Convert numpy float64 to Python float
-                voice_sample_url=upload_result.get('url') if upload_result['success'] else None,
-                ip_address=None  # Will be set by the route
+                confidence_score=float(similarity),
+                **self._request_columns(metadata)
             )
-            
-            db.session.add(attendance_record)
-            db.session.commit()
-            
-            # Log successful attendance
+            verified_entries.append((index, student, similarity, record, audio_file_path))
+        
+        # Read before the commit expires them
+        teacher_id = current_user.id
+        names = {student.id: (student.student_id, student.student_name) for _, student, _, _, _ in verified_entries}
+        
+        # Insert every verified record in one transaction
+        try:
+            self._insert_records([record for _, _, _, record, _ in verified_entries])
+            dashboard_stats.attendance_marked(teacher_id, len(verified_entries))
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Batch attendance error: {e}")
+            for index, student, similarity, _, _ in verified_entries:
+                results[index] = {'student_id': names[student.id][0], 'success': False,
+                                  'message': f"Attendance marking failed: {str(e)}", 'confidence': similarity}
+            return results
+        
+        for index, student, similarity, record, audio_file_path in verified_entries:
+            student_id, student_name = names[record.student_id]
+            upload_queue.enqueue(audio_file_path, 'attendance', record.id, student_id,
+                                 teacher_id, 'attendance')
             self.security_manager.log_security_event(
                 "SUCCESSFUL_ATTENDANCE", 
                 student_id, 
-                f"Attendance marked for {student.student_name} (confidence: {similarity:.4f})",
-                teacher_id=current_user.id
+                f"Attendance marked for {student_name} (confidence: {similarity:.4f})",
+                teacher_id=teacher_id
             )
-            
-            print(f"✅ Attendance marked successfully for {student.student_name}")
-            return True, f"Attendance marked successfully for {student.student_name}"
-            
-        except Exception as e:
-            db.session.rollback()
-            print(f"❌ Attendance error: {e}")
-            return False, f"Attendance marking failed: {str(e)}"
+            results[index] = {'student_id': student_id, 'success': True,
+                              'message': f"Attendance marked successfully for {student_name}",
+                              'confidence': similarity}
+        
+        print(f"✅ Batch attendance marked for {len(verified_entries)} of {len(entries)} students")
+        return results
     
     def verify_student_voice_db(self, student, audio_file_path, threshold=MIN_VOICE_THRESHOLD):
         """Enhanced voice verification using database student record"""
         try:
             print(f"🔍 Starting voice verification for {student.student_name}")
             
-            # Get stored features
-            stored_features = student.get_voice_features()
-            if not stored_features:
+            if not student.has_voice_features:
                 return False, "No voice features found for student", 0.0
             
             # Extract features from test audio
             test_features, message = self.extract_enhanced_voice_features(audio_file_path)
+            return self.verify_voice_features(student, test_features, message, threshold)
+            
+        except ExtractionPoolBusy:
+            raise
+        except Exception as e:
+            print(f"❌ Voice verification error: {e}")
+            return False, f"Verification error: {str(e)}", 0.0
+    
+    def verify_voice_features(self, student, test_features, message, threshold=MIN_VOICE_THRESHOLD):
+        """Score already extracted test features against a student's stored voiceprint"""
+        try:
+            # Get stored features
+            stored_features = student.get_voice_features()
+            if stored_features is None:
+                return False, "No voice features found for student", 0.0
+            
             if test_features is None:
                 self.security_manager.record_failed_attempt(student.student_id)
                 self.security_manager.log_security_event(
@@ -562,9 +730,6 @@ class EnhancedVoiceRecognitionSystem:
                 )
                 return False, f"Verification failed: {message}", 0.0
             
-            # Convert stored features to numpy array
-            stored_features = np.array(stored_features)
-            
             # Verify feature compatibility
             if len(test_features) != len(stored_features):
                 self.security_manager.record_failed_attempt(student.student_id)
@@ -576,15 +741,8 @@ class EnhancedVoiceRecognitionSystem:
                 )
                 return False, "Feature extraction error - please try again", 0.0
             
-            # Calculate similarity using multiple methods
-            cosine_sim = cosine_similarity([test_features], [stored_features])[0][0]
-            
-            # Additional similarity measures for enhanced security
-            euclidean_dist = np.linalg.norm(test_features - stored_features)
-            normalized_euclidean = 1 / (1 + euclidean_dist)  # Convert distance to similarity
-            
-            # Weighted combination of similarities
-            combined_similarity = 0.7 * cosine_sim + 0.3 * normalized_euclidean
+            # Cosine, Euclidean and weighted combined similarity in one pass
+            cosine_sim, normalized_euclidean, combined_similarity = score_pair(test_features, stored_features)
             
             print(f"🎯 Voice similarity analysis:")
             print(f"   Cosine similarity: {cosine_sim:.4f}")
@@ -623,36 +781,113 @@ class EnhancedVoiceRecognitionSystem:
             if not (current_user and hasattr(current_user, 'is_authenticated') and current_user.is_authenticated):
                 return []
             
-            query = AttendanceRecord.query.filter_by(teacher_id=current_user.id)
-            
             if date:
                 # Parse date and filter
                 target_date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
-                query = query.filter(db.func.date(AttendanceRecord.timestamp) == target_date)
             else:
                 # Default to today
-                today = datetime.datetime.now().date()
-                query = query.filter(db.func.date(AttendanceRecord.timestamp) == today)
-            
-            records = query.join(Student).all()
+                target_date = datetime.datetime.now().date()
+            day_start, day_end = day_bounds(target_date)
+            
+            # Only the columns the report shows, student details joined in the same query
+            rows = db.session.query(
+                Student.student_id, Student.student_name,
+                AttendanceRecord.timestamp, AttendanceRecord.status, AttendanceRecord.confidence_score
+            ).join(Student, AttendanceRecord.student_id == Student.id).filter(
+                AttendanceRecord.teacher_id == current_user.id,
+                AttendanceRecord.timestamp >= day_start,
+                AttendanceRecord.timestamp < day_end
+            ).order_by(AttendanceRecord.timestamp).all()
             
             # Format for compatibility with existing templates - return as dictionary
-            attendance_data = {}
-            for record in records:
-                attendance_data[record.student.student_id] = {
-                    'student_id': record.student.student_id,
-                    'name': record.student.student_name,
-                    'timestamp': record.timestamp.isoformat(),
-                    'status': record.status,
-                    'confidence': float(record.confidence_score)  # Convert to Python float
-                }
-            
-            return attendance_data
+            return {row.student_id: self._attendance_entry(row) for row in rows}
             
         except Exception as e:
             print(f"❌ Error getting attendance report: {e}")
             return []
     
+    @staticmethod
+    def _attendance_entry(row):
+        return {
+            'student_id': row.student_id,
+            'name': row.student_name,
+            'timestamp': row.timestamp.isoformat(),
+            'status': row.status,
+            'confidence': float(row.confidence_score)  # Convert to Python float
+        }
+    
+    def get_day_overview(self, date=None):
+        """Enrolled students and the day's attendance in one query
+        
+        Returns (students, attendance) shaped like get_all_students() and
+        get_attendance_report(date).
+        """
+        try:
+            if not (current_user and hasattr(current_user, 'is_authenticated') and current_user.is_authenticated):
+                return {}, {}
+            
+            target_date = datetime.datetime.strptime(date, '%Y-%m-%d').date() if date else datetime.datetime.now().date()
+            day_start, day_end = day_bounds(target_date)
+            
+            # Every student of the teacher with that day's record, if any
+            rows = db.session.query(
+                Student.student_id, Student.student_name, Student.is_active,
+                AttendanceRecord.timestamp, AttendanceRecord.status, AttendanceRecord.confidence_score
+            ).outerjoin(AttendanceRecord, db.and_(
+                AttendanceRecord.student_id == Student.id,
+                AttendanceRecord.teacher_id == current_user.id,
+                AttendanceRecord.timestamp >= day_start,
+                AttendanceRecord.timestamp < day_end
+            )).filter(Student.teacher_id == current_user.id).order_by(AttendanceRecord.timestamp).all()
+            
+            students = {row.student_id: row.student_name for row in rows if row.is_active}
+            attendance = {row.student_id: self._attendance_entry(row) for row in rows if row.timestamp is not None}
+            return students, attendance
+            
+        except Exception as e:
+            print(f"❌ Error getting day overview: {e}")
+            return {}, {}
+    
+    def get_attendance_summary(self, start_date, end_date):
+        """Attendance counts per active student over [start_date, end_date], aggregated in SQL"""
+        try:
+            if not (current_user and hasattr(current_user, 'is_authenticated') and current_user.is_authenticated):
+                return []
+            
+            range_start = day_bounds(start_date)[0]
+            range_end = day_bounds(end_date)[1]
+            rows = db.session.query(
+                Student.student_id, Student.student_name,
+                db.func.count(AttendanceRecord.id).label('days_present'),
+                db.func.min(AttendanceRecord.timestamp).label('first_seen'),
+                db.func.max(AttendanceRecord.timestamp).label('last_seen'),
+                db.func.avg(AttendanceRecord.confidence_score).label('average_confidence')
+            ).outerjoin(AttendanceRecord, db.and_(
+                AttendanceRecord.student_id == Student.id,
+                AttendanceRecord.teacher_id == current_user.id,
+                AttendanceRecord.timestamp >= range_start,
+                AttendanceRecord.timestamp < range_end
+            )).filter(
+                Student.teacher_id == current_user.id,
+                Student.is_active == True
+            ).group_by(Student.id, Student.student_id, Student.student_name).order_by(Student.student_id).all()
+            
+            return [
+                {
+                    'student_id': row.student_id,
+                    'name': row.student_name,
+                    'days_present': row.days_present,
+                    'first_seen': row.first_seen.isoformat() if row.first_seen else None,
+                    'last_seen': row.last_seen.isoformat() if row.last_seen else None,
+                    'average_confidence': round(float(row.average_confidence), 4) if row.average_confidence is not None else None
+                }
+                for row in rows
+            ]
+            
+        except Exception as e:
+            print(f"❌ Error getting attendance summary: {e}")
+            return []
+    
     def get_all_students(self):
         """Get all students for current teacher from database"""
         try:
@@ -660,7 +895,8 @@ class EnhancedVoiceRecognitionSystem:
             if not (current_user and hasattr(current_user, 'is_authenticated') and current_user.is_authenticated):
                 return {}
             
-            students = Student.query.filter_by(
+            # Names only - the voiceprint columns are not needed here
+            students = db.session.query(Student.student_id, Student.student_name).filter_by(
                 teacher_id=current_user.id, 
                 is_active=True
             ).all()
@@ -679,6 +915,9 @@ class EnhancedVoiceRecognitionSystem:
             if not (current_user and hasattr(current_user, 'is_authenticated') and current_user.is_authenticated):
                 return []
             
+            # Include events still waiting for the audit log thread
+            audit_log.flush()
+            
             # Calculate cutoff date
             cutoff_date = datetime.datetime.now() - datetime.timedelta(days=days)
             
@@ -694,6 +933,76 @@ class EnhancedVoiceRecognitionSystem:
         except Exception as e:
             print(f"❌ Error getting security report: {e}")
             return []
+    
+    def _security_events_query(self, days, event_type=None):
+        """The current teacher's events of the last `days` days (columns only, no ORM objects)"""
+        cutoff_date = datetime.datetime.now() - datetime.timedelta(days=days)
+        query = db.session.query(
+            SecurityLog.id, SecurityLog.timestamp, SecurityLog.event_type, SecurityLog.student_id,
+            SecurityLog.details, SecurityLog.ip_address, SecurityLog.teacher_id
+        ).filter(
+            SecurityLog.teacher_id == current_user.id,
+            SecurityLog.timestamp >= cutoff_date
+        )
+        if event_type:
+            query = query.filter(SecurityLog.event_type == event_type)
+        return query
+    
+    def get_security_events(self, days=30, limit=SECURITY_PAGE_SIZE, cursor=None, event_type=None):
+        """One page of the current teacher's security events, newest first
+        
+        Pages are keyset-paginated over (timestamp, id), which the
+        (teacher_id, timestamp, id) index serves directly, so later pages cost
+        the same as the first. Returns (events, next_cursor); next_cursor is
+        None on the last page. Raises ValueError for a malformed cursor.
+        """
+        if cursor is None:
+            # Include events still waiting for the audit log thread
+            audit_log.flush()
+        
+        query = self._security_events_query(days, event_type)
+        if cursor:
+            timestamp, row_id = decode_cursor(cursor)
+            query = query.filter(db.or_(
+                SecurityLog.timestamp < timestamp,
+                db.and_(SecurityLog.timestamp == timestamp, SecurityLog.id < row_id)
+            ))
+        
+        rows = query.order_by(SecurityLog.timestamp.desc(), SecurityLog.id.desc()).limit(limit + 1).all()
+        next_cursor = encode_cursor(rows[limit - 1].timestamp, rows[limit - 1].id) if len(rows) > limit else None
+        return [self._security_event_entry(row) for row in rows[:limit]], next_cursor
+    
+    def iter_security_events(self, days=30, event_type=None, batch_size=SECURITY_EXPORT_BATCH):
+        """All matching events, newest first, fetched a page at a time (for streaming exports)"""
+        cursor = None
+        while True:
+            events, cursor = self.get_security_events(days, batch_size, cursor, event_type)
+            yield from events
+            if cursor is None:
+                return
+    
+    def get_security_event_counts(self, days=30):
+        """Event counts per type over the last `days` days, grouped in SQL"""
+        audit_log.flush()
+        cutoff_date = datetime.datetime.now() - datetime.timedelta(days=days)
+        rows = db.session.query(SecurityLog.event_type, db.func.count(SecurityLog.id)).filter(
+            SecurityLog.teacher_id == current_user.id,
+            SecurityLog.timestamp >= cutoff_date
+        ).group_by(SecurityLog.event_type).all()
+        return {event_type: count for event_type, count in rows}
+    
+    @staticmethod
+    def _security_event_entry(row):
+        """Same shape as SecurityLog.to_dict()"""
+        return {
+            'id': row.id,
+            'timestamp': row.timestamp.isoformat(),
+            'event_type': row.event_type,
+            'student_id': row.student_id,
+            'details': row.details,
+            'ip_address': row.ip_address,
+            'teacher_id': row.teacher_id
+        }
 
     
     def load_voice_models(self):
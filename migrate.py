@@ -12,13 +12,12 @@ from pathlib import Path
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
-from app import create_app
-from config.models import db
+from app import app  # importing app builds the app once; both steps reuse it
+from config.models import db, Student
+import json
 
-def create_database_tables():
+def create_database_tables(app):
     """Create all database tables"""
-    app = create_app()
-    
     with app.app_context():
         # Create all tables
         db.create_all()
@@ -30,6 +29,39 @@ def create_database_tables():
         tables = inspector.get_table_names()
         print(f"📊 Created tables: {', '.join(tables)}")
 
+def migrate_voice_features_to_binary(app, batch_size=500):
+    """Convert legacy JSON voice features into binary float32 voiceprints"""
+    with app.app_context():
+        converted = 0
+        skipped = 0
+        last_id = 0
+        while True:
+            # Page by id - skipped rows stay unconverted and must not be fetched again
+            students = Student.query.filter(
+                Student.voice_embedding.is_(None),
+                Student.voice_features.isnot(None),
+                Student.id > last_id
+            ).order_by(Student.id).limit(batch_size).all()
+            
+            if not students:
+                break
+            
+            for student in students:
+                last_id = student.id
+                try:
+                    features = json.loads(student.voice_features)
+                    if not isinstance(features, list) or not features:
+                        raise ValueError(f"no feature list in {student.voice_features[:40]!r}")
+                    student.set_voice_features(features)
+                    converted += 1
+                except (ValueError, TypeError) as e:
+                    skipped += 1
+                    print(f"⚠️ Skipping voice features of student {student.student_id} (id {student.id}): {e}")
+            db.session.commit()
+            print(f"🔄 Converted {converted} voiceprints to binary...")
+        
+        print(f"✅ Voiceprint migration complete: {converted} students converted, {skipped} skipped")
+
 def check_environment():
     """Check if all required environment variables are set"""
     required_vars = [
@@ -66,7 +98,10 @@ if __name__ == "__main__":
     
     try:
         # Create database tables
-        create_database_tables()
+        create_database_tables(app)
+        
+        # Move stored voice features from JSON text to binary voiceprints
+        migrate_voice_features_to_binary(app)
         
         print("\n🎉 Migration completed successfully!")
         print("\nNext steps:")
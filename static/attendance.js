@@ -1,10 +1,12 @@
 let mediaRecorder, audioChunks = [], audioBlob;
 let recordingTimer, startTime;
+let liveStream = null; // VoiceStream uploading the recording while it is made
 
 const recordBtn = document.getElementById('recordBtn');
 const voiceFileInput = document.getElementById('voice_sample');
 const attendanceForm = document.querySelector('form');
 const timer = document.getElementById('timer');
+const identifyModeToggle = document.getElementById('identifyMode');
 
 // Audio config for librosa compatibility
 const audioConfig = { audio: { channelCount: 1, sampleRate: 22050, sampleSize: 16 } };
@@ -19,6 +21,13 @@ document.addEventListener('DOMContentLoaded', function() {
 
 recordBtn.addEventListener('click', toggleRecording);
 
+// Identify mode: the student just speaks and the server finds who it is
+identifyModeToggle?.addEventListener('change', function() {
+    const studentSelect = document.getElementById('student_id');
+    studentSelect.disabled = this.checked;
+    studentSelect.required = !this.checked;
+});
+
 async function toggleRecording() {
     if (!mediaRecorder || mediaRecorder.state === 'inactive') {
         startRecording();
@@ -30,11 +39,14 @@ async function toggleRecording() {
 async function startRecording() {
     try {
         const stream = await navigator.mediaDevices.getUserMedia(audioConfig);
+        discardLiveStream();
+        liveStream = await VoiceStream.start(stream);
         mediaRecorder = new MediaRecorder(stream);
         audioChunks = [];
         
         mediaRecorder.ondataavailable = e => audioChunks.push(e.data);
         mediaRecorder.onstop = async () => {
+            liveStream?.stop();
             const webmBlob = new Blob(audioChunks, { type: 'audio/webm' });
             audioBlob = await convertToWav(webmBlob);
             
@@ -95,8 +107,14 @@ function showAudioPlayback() {
     // Insert after the recording section
 }
 
+function discardLiveStream() {
+    liveStream?.stop();
+    liveStream = null;
+}
+
 function reRecord() {
     audioBlob = null;
+    discardLiveStream();
     voiceFileInput.required = true;
     
     const audioPlayback = document.getElementById('audioPlayback');
@@ -173,14 +191,15 @@ function audioBufferToWav(audioBuffer) {
 }
 
 // Handle form submission with proper FormData and spinner
-attendanceForm.addEventListener('submit', function(e) {
+attendanceForm.addEventListener('submit', async function(e) {
     e.preventDefault(); // Always prevent default
     
     const studentSelect = document.getElementById('student_id');
+    const identifyMode = identifyModeToggle?.checked;
     console.log('Student select element:', studentSelect);
     console.log('Student select value:', studentSelect?.value);
     
-    if (!studentSelect.value) {
+    if (!identifyMode && !studentSelect.value) {
         showAlert('Please select a student', 'warning');
         return;
     }
@@ -193,13 +212,46 @@ attendanceForm.addEventListener('submit', function(e) {
     // Show loading spinner
     showLoading();
     
+    const url = identifyMode ? this.dataset.identifyAction : this.action;
+    
+    try {
+        // Prefer the live stream - the server has already analysed all but its last chunk
+        const streamId = audioBlob && liveStream ? await liveStream.finish() : null;
+        liveStream = null;
+        
+        let data = await submitAttendance(url, identifyMode, streamId);
+        if (data.stream_expired) {
+            data = await submitAttendance(url, identifyMode, null);
+        }
+        
+        hideLoading();
+        if (data.success) {
+            showAlert(data.message || 'Attendance marked successfully!', 'success');
+            // Reset form after successful attendance
+            resetForm();
+        } else {
+            showAlert(data.message || 'Attendance marking failed', 'danger');
+        }
+    } catch (error) {
+        hideLoading();
+        console.error('Error:', error);
+        showAlert('Network error. Please try again.', 'danger');
+    }
+});
+
+async function submitAttendance(url, identifyMode, streamId) {
     const formData = new FormData();
     
     // Explicitly add form fields
-    formData.append('student_id', studentSelect.value);
+    if (!identifyMode) {
+        formData.append('student_id', document.getElementById('student_id').value);
+    }
     
-    // Add recorded audio or uploaded file
-    if (audioBlob) {
+    // Add the live stream, recorded audio or uploaded file
+    if (streamId) {
+        formData.append('stream_id', streamId);
+        console.log('Added live recording stream to form');
+    } else if (audioBlob) {
         formData.append('recorded_audio', audioBlob, 'attendance_recording.wav');
         console.log('Added recorded audio to form');
     } else if (voiceFileInput.files.length > 0) {
@@ -214,31 +266,20 @@ attendanceForm.addEventListener('submit', function(e) {
     }
     
     // Submit via fetch
-    fetch(this.action, {
+    const response = await fetch(url, {
         method: 'POST',
         body: formData
-    })
-    .then(response => response.json())
-    .then(data => {
-        hideLoading();
-        if (data.success) {
-            showAlert(data.message || 'Attendance marked successfully!', 'success');
-            // Reset form after successful attendance
-            resetForm();
-        } else {
-            showAlert(data.message || 'Attendance marking failed', 'danger');
-        }
-    })
-    .catch(error => {
-        hideLoading();
-        console.error('Error:', error);
-        showAlert('Network error. Please try again.', 'danger');
     });
-});
+    return response.json();
+}
 
 function resetForm() {
     attendanceForm.reset();
+    const studentSelect = document.getElementById('student_id');
+    studentSelect.disabled = false;
+    studentSelect.required = true;
     audioBlob = null;
+    discardLiveStream();
     voiceFileInput.required = true;
     
     // Remove audio playback
@@ -367,6 +408,7 @@ function showAlert(message, type) {
 voiceFileInput.addEventListener('change', function() {
     if (this.files.length > 0) {
         audioBlob = null;
+        discardLiveStream();
         const audioPlayback = document.getElementById('audioPlayback');
         if (audioPlayback) audioPlayback.remove();
         recordBtn.className = 'btn-record text-white px-6 py-2 rounded-md font-medium transition-colors mb-4';
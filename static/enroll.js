@@ -1,5 +1,6 @@
 let mediaRecorder, audioChunks = [], audioBlob;
 let recordingTimer, startTime;
+let liveStream = null; // VoiceStream uploading the recording while it is made
 
 const recordBtn = document.getElementById('recordBtn');
 const voiceFileInput = document.getElementById('voice_sample');
@@ -30,11 +31,14 @@ async function toggleRecording() {
 async function startRecording() {
     try {
         const stream = await navigator.mediaDevices.getUserMedia(audioConfig);
+        discardLiveStream();
+        liveStream = await VoiceStream.start(stream, document.querySelector('input[name="teacher_id"]')?.value);
         mediaRecorder = new MediaRecorder(stream);
         audioChunks = [];
         
         mediaRecorder.ondataavailable = e => audioChunks.push(e.data);
         mediaRecorder.onstop = async () => {
+            liveStream?.stop();
             const webmBlob = new Blob(audioChunks, { type: 'audio/webm' });
             audioBlob = await convertToWav(webmBlob);
             
@@ -93,8 +97,14 @@ function showAudioPlayback() {
     document.getElementById('recordingStatus').appendChild(audioDiv);
 }
 
+function discardLiveStream() {
+    liveStream?.stop();
+    liveStream = null;
+}
+
 function reRecord() {
     audioBlob = null;
+    discardLiveStream();
     voiceFileInput.required = true;
     
     const audioPlayback = document.getElementById('audioPlayback');
@@ -231,7 +241,7 @@ function showAlert(message, type) {
 }
 
 // Handle form submission
-enrollForm.addEventListener('submit', function(e) {
+enrollForm.addEventListener('submit', async function(e) {
     e.preventDefault(); // Always prevent default
     
     const studentId = document.getElementById('student_id').value.trim();
@@ -252,6 +262,42 @@ enrollForm.addEventListener('submit', function(e) {
     // Show loading spinner
     showLoading();
     
+    try {
+        // Prefer the live stream - the server has already analysed all but its last chunk
+        const streamId = audioBlob && liveStream ? await liveStream.finish() : null;
+        liveStream = null;
+        
+        let data = await submitEnrollment(this.action, studentId, studentName, streamId);
+        if (data.stream_expired) {
+            data = await submitEnrollment(this.action, studentId, studentName, null);
+        }
+        
+        hideLoading();
+        if (data.success) {
+            showAlert(data.message || 'Student enrolled successfully!', 'success');
+            // Reset form after successful enrollment
+            enrollForm.reset();
+            audioBlob = null;
+            voiceFileInput.required = true;
+            
+            // Remove audio playback
+            const audioPlayback = document.getElementById('audioPlayback');
+            if (audioPlayback) audioPlayback.remove();
+            
+            // Reset record button
+            recordBtn.className = 'btn-record text-white px-6 py-2 rounded-md font-medium transition-colors mb-4';
+            recordBtn.innerHTML = '<i class="fas fa-microphone mr-2"></i>Start Recording';
+        } else {
+            showAlert(data.message || 'Enrollment failed');
+        }
+    } catch (error) {
+        hideLoading();
+        console.error('Error:', error);
+        showAlert('Network error. Please try again.', 'error');
+    }
+});
+
+async function submitEnrollment(url, studentId, studentName, streamId) {
     const formData = new FormData();
     
     // Explicitly add form fields
@@ -267,8 +313,11 @@ enrollForm.addEventListener('submit', function(e) {
         console.error('Teacher ID field not found!');
     }
     
-    // Add recorded audio or uploaded file
-    if (audioBlob) {
+    // Add the live stream, recorded audio or uploaded file
+    if (streamId) {
+        formData.append('stream_id', streamId);
+        console.log('Added live recording stream to form');
+    } else if (audioBlob) {
         formData.append('recorded_audio', audioBlob, 'enrollment_recording.wav');
         console.log('Added recorded audio to form');
     } else if (voiceFileInput.files.length > 0) {
@@ -282,37 +331,12 @@ enrollForm.addEventListener('submit', function(e) {
     }
     
     // Submit via fetch
-    fetch(this.action, {
+    const response = await fetch(url, {
         method: 'POST',
         body: formData
-    })
-    .then(response => response.json())
-    .then(data => {
-        hideLoading();
-        if (data.success) {
-            showAlert(data.message || 'Student enrolled successfully!', 'success');
-            // Reset form after successful enrollment
-            enrollForm.reset();
-            audioBlob = null;
-            voiceFileInput.required = true;
-            
-            // Remove audio playback
-            const audioPlayback = document.getElementById('audioPlayback');
-            if (audioPlayback) audioPlayback.remove();
-            
-            // Reset record button
-            recordBtn.className = 'btn-record text-white px-6 py-2 rounded-md font-medium transition-colors mb-4';
-            recordBtn.innerHTML = '<i class="fas fa-microphone mr-2"></i>Start Recording';
-        } else {
-            showAlert(data.message || 'Enrollment failed');
-        }
-    })
-    .catch(error => {
-        hideLoading();
-        console.error('Error:', error);
-        showAlert('Network error. Please try again.', 'error');
     });
-});
+    return response.json();
+}
 
 function showLoading() {
     const overlay = document.createElement('div');
@@ -368,6 +392,7 @@ function hideLoading() {
 voiceFileInput.addEventListener('change', function() {
     if (this.files.length > 0) {
         audioBlob = null;
+        discardLiveStream();
         const audioPlayback = document.getElementById('audioPlayback');
         if (audioPlayback) audioPlayback.remove();
         recordBtn.className = 'btn-record text-white px-6 py-2 rounded-md font-medium transition-colors mb-4';
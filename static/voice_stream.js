@@ -0,0 +1,107 @@
+// Live recording upload shared by the enrollment and attendance pages.
+// While the student speaks, 16-bit PCM is sent to /api/stream in chunks so the
+// server has analysed all but the last chunk by the time the form is submitted.
+// Any failure marks the stream as failed and the page uploads the WAV instead.
+// Pages without a teacher login (enrollment) pass the teacher id of their link.
+class VoiceStream {
+    static async start(mediaStream, teacherId = null) {
+        try {
+            const body = new FormData();
+            if (teacherId) body.append('teacher_id', teacherId);
+            const response = await fetch('/api/stream/start', { method: 'POST', body });
+            const config = await response.json();
+            if (!config.success) return null;
+
+            const stream = new VoiceStream(mediaStream, config, teacherId);
+            return stream.failed ? null : stream;
+        } catch (error) {
+            console.warn('Live recording upload unavailable:', error);
+            return null;
+        }
+    }
+
+    constructor(mediaStream, config, teacherId = null) {
+        this.id = config.stream_id;
+        this.query = teacherId ? `&teacher_id=${encodeURIComponent(teacherId)}` : '';
+        this.sampleRate = config.sample_rate;
+        this.chunkSamples = Math.round(config.chunk_seconds * config.sample_rate);
+        this.maxSamples = Math.floor(config.max_duration * config.sample_rate);
+        this.pending = [];
+        this.pendingSamples = 0;
+        this.sentSamples = 0;
+        this.offset = 0;
+        this.failed = false;
+        this.upload = Promise.resolve();
+
+        this.context = new (window.AudioContext || window.webkitAudioContext)({ sampleRate: this.sampleRate });
+        if (this.context.sampleRate !== this.sampleRate) {
+            // The server expects exactly this rate - leave it to the WAV upload
+            this.failed = true;
+            this.context.close();
+            return;
+        }
+
+        this.source = this.context.createMediaStreamSource(mediaStream);
+        this.processor = this.context.createScriptProcessor(4096, 1, 1);
+        this.processor.onaudioprocess = e => this.capture(e.inputBuffer.getChannelData(0));
+        this.source.connect(this.processor);
+        this.processor.connect(this.context.destination);
+    }
+
+    capture(samples) {
+        this.pending.push(new Float32Array(samples));
+        this.pendingSamples += samples.length;
+        if (this.pendingSamples >= this.chunkSamples) this.flush();
+    }
+
+    // Convert the captured samples to 16-bit PCM (same as the WAV upload) and queue the chunk
+    flush() {
+        if (!this.pendingSamples || this.failed) return;
+
+        const count = Math.min(this.pendingSamples, this.maxSamples - this.sentSamples);
+        const pcm = new Int16Array(count);
+        let i = 0;
+        for (const block of this.pending) {
+            for (let j = 0; j < block.length && i < count; j++, i++) {
+                pcm[i] = Math.max(-1, Math.min(1, block[j])) * 0x7FFF;
+            }
+        }
+        this.pending = [];
+        this.pendingSamples = 0;
+        this.sentSamples += count;
+        if (!count) return;
+
+        // Chunks are sent one after another; the offset lets the server spot gaps and retries
+        const offset = this.offset;
+        this.offset += pcm.byteLength;
+        this.upload = this.upload
+            .then(() => this.failed ? null : fetch(`/api/stream/${this.id}/chunk?offset=${offset}${this.query}`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/octet-stream' },
+                body: pcm.buffer
+            }))
+            .then(response => {
+                if (response && !response.ok) throw new Error(`Chunk rejected (${response.status})`);
+            })
+            .catch(error => {
+                console.warn('Live recording upload failed:', error);
+                this.failed = true;
+            });
+    }
+
+    stop() {
+        if (!this.processor) return;
+        this.processor.disconnect();
+        this.source.disconnect();
+        this.processor = null;
+        this.flush();
+        this.context.close();
+    }
+
+    // Resolves to the stream id once every chunk is stored, or null if the WAV must be sent instead
+    async finish() {
+        this.stop();
+        await this.upload;
+        return this.failed ? null : this.id;
+    }
+}